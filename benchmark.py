@@ -0,0 +1,449 @@
+"""
+Benchmark de carga da E-Commerce API
+
+Sobe a API (uvicorn) contra um banco MySQL local dedicado, popula o banco com
+dados sintéticos e executa cargas mistas com concorrência fixa. O resultado
+(vazão e p50/p95/p99 por endpoint) sai em JSON para comparar execuções.
+
+    python benchmark.py --output resultado.json
+    python benchmark.py --scenarios browse,checkout --compare resultado.json
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from decimal import Decimal
+from datetime import datetime
+
+# Banco dedicado: o benchmark APAGA os dados dele antes de popular
+BENCH_DB_NAME = os.getenv('BENCH_DB_NAME', 'ecommerce_bench')
+os.environ['DB_NAME'] = BENCH_DB_NAME
+
+import main  # noqa: E402  (lê DB_NAME na importação)
+import mysql.connector  # noqa: E402
+
+BENCH_PASSWORD = "bench-password"
+SHIPPING = {"shipping_address": "Rua do Benchmark, 100", "payment_method": "credit_card"}
+SEARCH_TERMS = ["produto", "premium", "azul", "kit", "eletro", "casa", "esporte", "livro"]
+WORDS = ["azul", "verde", "premium", "kit", "casa", "esporte", "livro", "eletro",
+         "cozinha", "jardim", "digital", "clássico", "compacto", "portátil"]
+
+def percentile(sorted_values, pct):
+    """Percentil por posição mais próxima (valores já ordenados)"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+# ---------------------------------------------------------------------------
+# Banco e servidor
+# ---------------------------------------------------------------------------
+
+def prepare_database(args):
+    """Recria os dados do banco de benchmark com as migrações e o hash de senha da API"""
+    server = {key: value for key, value in main.DB_CONFIG.items() if key != 'database'}
+    connection = mysql.connector.connect(**server)
+    cursor = connection.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{BENCH_DB_NAME}`")
+    cursor.close()
+    connection.close()
+
+    connection = main.get_db_connection()
+    if not connection:
+        raise SystemExit(f"Não foi possível conectar ao banco {BENCH_DB_NAME}")
+    try:
+        main.run_migrations(connection)
+        cursor = connection.cursor()
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in ("order_items", "orders", "cart_items", "stock_reservations", "inventory_slots",
+                      "products", "categories", "users", "jobs", "cache_invalidations",
+                      "sales_daily", "sales_product_daily", "sales_category_daily"):
+            cursor.execute(f"TRUNCATE TABLE {table}")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+        rng = random.Random(args.seed)
+        # Um único hash para todos: popular o banco não deve custar N bcrypts
+        password_hash = main.pwd_context.hash(BENCH_PASSWORD)
+        cursor.executemany(
+            "INSERT INTO users (username, email, password_hash, full_name) VALUES (%s, %s, %s, %s)",
+            [(f"bench{i}", f"bench{i}@example.com", password_hash, f"Bench User {i}")
+             for i in range(args.users)])
+        cursor.executemany(
+            "INSERT INTO categories (name, description) VALUES (%s, %s)",
+            [(f"Categoria {i}", f"Categoria sintética {i}") for i in range(args.categories)])
+        rows = []
+        for i in range(args.products):
+            words = " ".join(rng.sample(WORDS, 3))
+            rows.append((f"Produto {i} {words}", f"Descrição do produto {i}: {words}",
+                         Decimal(rng.randint(100, 100000)) / 100, args.stock,
+                         1 + i % args.categories, None))
+            if len(rows) == 1000:
+                cursor.executemany(main.PRODUCT_INSERT, rows)
+                rows = []
+        if rows:
+            cursor.executemany(main.PRODUCT_INSERT, rows)
+        connection.commit()
+        cursor.close()
+        # Produtos disputados com o estoque em slots (0 = na linha do produto, como antes)
+        if args.hot_slots:
+            for product_id in range(1, args.hot_products + 1):
+                main.set_hot_product(connection, product_id, args.hot_slots)
+    finally:
+        connection.close()
+        main.db_pool.dispose()
+
+def start_server(args):
+    env = dict(os.environ, DB_NAME=BENCH_DB_NAME)
+    # Todos os workers saem do mesmo IP: sem isso o cenário de login mediria só o 429
+    env.setdefault('RATE_LIMIT_ENABLED', 'false')
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--log-level", "warning", "--no-access-log"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("O servidor encerrou durante a inicialização")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", args.port, timeout=2)
+            # Só mede depois do aquecimento: /health responde antes de o banco estar pronto
+            conn.request("GET", "/health/ready")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("Timeout aguardando o servidor")
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+# ---------------------------------------------------------------------------
+# Cliente
+# ---------------------------------------------------------------------------
+
+class Client:
+    """Conexão keep-alive de um worker; registra latência e status por endpoint"""
+
+    def __init__(self, port, recorder):
+        self.port = port
+        self.recorder = recorder
+        self.token = None
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    def request(self, method, path, label, body=None):
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+            data, status = b"", 0
+        self.recorder.record(label, time.perf_counter() - start, status)
+        return status, data
+
+    def login(self, username):
+        status, data = self.request("POST", "/auth/login", "POST /auth/login",
+                                    {"username": username, "password": BENCH_PASSWORD})
+        if status != 200:
+            raise RuntimeError(f"Login de {username} falhou ({status})")
+        self.token = json.loads(data)["access_token"]
+
+class Recorder:
+    # 409 (estoque insuficiente) e 400 (carrinho vazio) são respostas esperadas sob disputa
+    EXPECTED = {200, 304, 400, 409}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.samples = {}
+
+    def record(self, label, elapsed, status):
+        if not self.enabled:
+            return
+        with self.lock:
+            latencies, statuses = self.samples.setdefault(label, ([], {}))
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for label, (latencies, statuses) in sorted(self.samples.items()):
+            errors = sum(count for code, count in statuses.items() if code not in self.EXPECTED)
+            endpoints[label] = summarize(latencies, errors, elapsed)
+            endpoints[label]["status"] = {str(code): count for code, count in sorted(statuses.items())}
+        every = [value for latencies, _ in self.samples.values() for value in latencies]
+        total = summarize(every, sum(item["errors"] for item in endpoints.values()), elapsed)
+        return {"total": total, "endpoints": endpoints}
+
+# ---------------------------------------------------------------------------
+# Cargas
+# ---------------------------------------------------------------------------
+
+def browse(client, rng, args):
+    choice = rng.random()
+    if choice < 0.45:
+        category = rng.randint(1, args.categories)
+        client.request("GET", f"/products?category_id={category}&limit=20", "GET /products")
+    elif choice < 0.75:
+        client.request("GET", f"/products/{rng.randint(1, args.products)}", "GET /products/{id}")
+    elif choice < 0.9:
+        client.request("GET", f"/products/search?q={rng.choice(SEARCH_TERMS)}", "GET /products/search")
+    else:
+        client.request("GET", "/categories", "GET /categories")
+
+def cart(client, rng, args):
+    choice = rng.random()
+    if choice < 0.5:
+        client.request("POST", "/cart/add", "POST /cart/add",
+                       {"product_id": rng.randint(1, args.products), "quantity": 1})
+    elif choice < 0.8:
+        client.request("GET", "/cart", "GET /cart")
+    else:
+        browse(client, rng, args)
+
+def checkout(client, rng, args, product_ids=None):
+    for _ in range(rng.randint(1, 3)):
+        product_id = rng.choice(product_ids) if product_ids else rng.randint(1, args.products)
+        client.request("POST", "/cart/add", "POST /cart/add", {"product_id": product_id, "quantity": 1})
+    client.request("POST", "/orders/checkout", "POST /orders/checkout", SHIPPING)
+
+def hot_product(client, rng, args):
+    # Todos disputam os mesmos poucos produtos: mede as travas de estoque no checkout
+    checkout(client, rng, args, product_ids=list(range(1, args.hot_products + 1)))
+
+def hot_sku(client, rng, args):
+    # Um único produto em todos os checkouts: compare --hot-slots 0 com --hot-slots 16
+    checkout(client, rng, args, product_ids=[1])
+
+def login(client, rng, args):
+    client.request("POST", "/auth/login", "POST /auth/login",
+                   {"username": f"bench{rng.randrange(args.users)}", "password": BENCH_PASSWORD})
+
+def mixed(client, rng, args):
+    choice = rng.random()
+    if choice < 0.7:
+        browse(client, rng, args)
+    elif choice < 0.9:
+        cart(client, rng, args)
+    elif choice < 0.97:
+        checkout(client, rng, args)
+    else:
+        client.request("GET", "/orders?limit=10", "GET /orders")
+
+SCENARIOS = {
+    "browse": browse,
+    "cart": cart,
+    "checkout": checkout,
+    "hot-product": hot_product,
+    "hot-sku": hot_sku,
+    "login": login,
+    "mixed": mixed,
+}
+
+def run_scenario(name, args):
+    """Executa um cenário com `concurrency` workers; o aquecimento não entra nas métricas"""
+    recorder = Recorder()
+    operation = SCENARIOS[name]
+    stop = threading.Event()
+    ready = threading.Barrier(args.concurrency + 1)
+    failures = []
+
+    def worker(index):
+        rng = random.Random(f"{args.seed}-{name}-{index}")
+        client = Client(args.port, recorder)
+        try:
+            client.login(f"bench{index % args.users}")
+        except RuntimeError as e:
+            failures.append(str(e))
+        ready.wait()
+        while not stop.is_set() and not failures:
+            operation(client, rng, args)
+        client.conn.close()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    time.sleep(args.warmup)
+    recorder.enabled = True
+    start = time.perf_counter()
+    time.sleep(args.duration)
+    recorder.enabled = False
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise SystemExit(failures[0])
+    return recorder.report(elapsed)
+
+def serialization_benchmark(rows=2000, rounds=20):
+    """Custo por linha de serializar produtos: response_model do FastAPI vs. orjson direto"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    now = datetime.now()
+    data = [{"id": i, "name": f"Produto {i}", "description": "Descrição " * 5,
+             "price": Decimal("199.90"), "stock": 10, "category_id": 1,
+             "image_url": None, "created_at": now} for i in range(rows)]
+
+    def pydantic_path():
+        products = [main.Product(**row) for row in data]
+        JSONResponse(jsonable_encoder(products)).body
+
+    def orjson_path():
+        convert = main.row_converter(main.Product)
+        main.orjson.dumps([convert(row) for row in data])
+
+    result = {}
+    for label, func in (("response_model", pydantic_path), ("orjson", orjson_path)):
+        func()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        result[label] = {"us_per_row": round((time.perf_counter() - start) / (rows * rounds) * 1e6, 3)}
+    return result
+
+# ---------------------------------------------------------------------------
+# Comparação
+# ---------------------------------------------------------------------------
+
+def compare(baseline, current, threshold):
+    """Lista regressões de p95 ou vazão acima de `threshold` (fração) entre duas execuções"""
+    regressions = []
+    for scenario, result in current.get("scenarios", {}).items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if not previous:
+            continue
+        for label, stats in result["endpoints"].items():
+            before = previous["endpoints"].get(label)
+            if not before:
+                continue
+            if before["p95_ms"] and stats["p95_ms"] > before["p95_ms"] * (1 + threshold):
+                regressions.append(f"{scenario} {label}: p95 {before['p95_ms']} -> {stats['p95_ms']} ms")
+            if stats["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+                regressions.append(f"{scenario} {label}: vazão {before['throughput_rps']} -> "
+                                   f"{stats['throughput_rps']} req/s")
+    return regressions
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de carga da E-Commerce API")
+    parser.add_argument("--scenarios", default="browse,cart,checkout,hot-product,login,mixed",
+                        help=f"cenários separados por vírgula ({', '.join(SCENARIOS)}, serialization)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20, help="segundos medidos por cenário")
+    parser.add_argument("--warmup", type=float, default=3, help="segundos descartados por cenário")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--stock", type=int, default=1000000)
+    parser.add_argument("--hot-products", type=int, default=3)
+    parser.add_argument("--hot-slots", type=int, default=0,
+                        help="slots de estoque dos produtos disputados (0 = estoque na linha do produto)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para checar regressões")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="piora tolerada na comparação (fração, padrão 0.10)")
+    return parser.parse_args()
+
+def run():
+    args = parse_args()
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS and name != "serialization"]
+    if unknown:
+        raise SystemExit(f"Cenários desconhecidos: {', '.join(unknown)}")
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items()
+                       if key not in ("output", "compare", "threshold")},
+            "env": {key: os.environ[key] for key in sorted(os.environ)
+                    if key.startswith(("DB_POOL_", "API_THREADPOOL", "BCRYPT_", "HASH_", "FAST_JSON",
+                                           "RATE_LIMIT_", "ADMISSION_", "WEB_CONCURRENCY", "CACHE_SYNC",
+                                           "CART_"))},
+        },
+        "scenarios": {},
+    }
+
+    if "serialization" in names:
+        report["serialization"] = serialization_benchmark()
+    load = [name for name in names if name in SCENARIOS]
+    if load:
+        print(f"Populando {BENCH_DB_NAME}...", file=sys.stderr)
+        prepare_database(args)
+        server = start_server(args)
+        try:
+            for name in load:
+                print(f"Cenário {name}: {args.concurrency} workers por {args.duration}s", file=sys.stderr)
+                report["scenarios"][name] = run_scenario(name, args)
+        finally:
+            stop_server(server)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for line in regressions:
+            print(f"REGRESSÃO {line}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    run()
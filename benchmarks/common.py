@@ -0,0 +1,86 @@
+"""Cliente HTTP e estatísticas compartilhados pelos benchmarks (API já no ar, sem dependências)"""
+
+import http.client
+import json
+import math
+import threading
+import time
+from urllib.parse import urlsplit
+
+PASSWORD = "bench-password"
+
+def percentile(sorted_values, pct):
+    """Percentil por posição mais próxima (valores já ordenados)"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+def summarize(latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "status": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+class Client:
+    """Conexão keep-alive; request devolve (segundos, status, corpo)"""
+
+    def __init__(self, url, token=None):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        self.token = token
+
+    def request(self, method, path, body=None):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                              headers=headers)
+            response = self.conn.getresponse()
+            data, status = response.read(), response.status
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            data, status = b"", 0
+        return time.perf_counter() - start, status, data
+
+    def close(self):
+        self.conn.close()
+
+def ensure_user(url, username):
+    """Cadastra o usuário (400 se já existir) e devolve o token dele"""
+    client = Client(url)
+    try:
+        client.request("POST", "/auth/register", {"username": username, "email": f"{username}@example.com",
+                                                   "password": PASSWORD, "full_name": username})
+        _, status, data = client.request("POST", "/auth/login", {"username": username, "password": PASSWORD})
+    finally:
+        client.close()
+    if status != 200:
+        raise SystemExit(f"Login de {username} falhou ({status})")
+    return json.loads(data)["access_token"]
+
+class Recorder:
+    """Latências e status por rótulo, de várias threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, label, elapsed, status):
+        with self.lock:
+            latencies, statuses = self.samples.setdefault(label, ([], {}))
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    def report(self, elapsed):
+        return {label: summarize(latencies, statuses, elapsed)
+                for label, (latencies, statuses) in sorted(self.samples.items())}
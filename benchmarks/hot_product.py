@@ -0,0 +1,89 @@
+"""
+Benchmark de disputa no checkout: centenas de compradores no mesmo produto
+
+Roda contra uma API já no ar. Cadastra os compradores e um produto com estoque limitado;
+cada comprador repete carrinho + checkout desse produto até o fim. Mede a vazão e a
+latência do checkout e confere que não houve venda além do estoque: pedidos aceitos +
+estoque final = estoque inicial. Cadastrar centenas de usuários custa um bcrypt cada;
+rode a API com BCRYPT_ROUNDS baixo.
+
+    python benchmarks/hot_product.py --url http://127.0.0.1:8000 --buyers 200 --stock 500
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import Client, Recorder, ensure_user
+
+SHIPPING = {"shipping_address": "Rua do Benchmark, 100", "payment_method": "credit_card"}
+
+def create_product(url, token, stock):
+    client = Client(url, token)
+    try:
+        _, status, data = client.request("POST", "/categories", {"name": f"Disputa {time.time_ns()}"})
+        if status != 200:
+            raise SystemExit(f"Falha ao criar a categoria ({status})")
+        _, status, data = client.request("POST", "/products", {
+            "name": "Produto disputado", "description": "Benchmark de checkout", "price": "10.00",
+            "stock": stock, "category_id": json.loads(data)["id"]})
+        if status != 200:
+            raise SystemExit(f"Falha ao criar o produto ({status})")
+        return json.loads(data)["id"]
+    finally:
+        client.close()
+
+def product_stock(url, product_id):
+    client = Client(url)
+    try:
+        _, status, data = client.request("GET", f"/products/{product_id}")
+        return json.loads(data)["stock"]
+    finally:
+        client.close()
+
+def run():
+    parser = argparse.ArgumentParser(description="Benchmark de disputa no checkout da E-Commerce API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--buyers", type=int, default=200, help="compradores simultâneos")
+    parser.add_argument("--stock", type=int, default=500, help="estoque inicial do produto")
+    parser.add_argument("--rounds", type=int, default=5, help="checkouts tentados por comprador")
+    args = parser.parse_args()
+
+    with ThreadPoolExecutor(16) as executor:
+        tokens = list(executor.map(lambda i: ensure_user(args.url, f"bench-buyer{i}"), range(args.buyers)))
+    product_id = create_product(args.url, tokens[0], args.stock)
+
+    recorder = Recorder()
+    start_line = threading.Barrier(args.buyers + 1)
+
+    def buyer(token):
+        client = Client(args.url, token)
+        start_line.wait()
+        for _ in range(args.rounds):
+            elapsed, status, _ = client.request("POST", "/cart/add", {"product_id": product_id, "quantity": 1})
+            recorder.record("POST /cart/add", elapsed, status)
+            elapsed, status, _ = client.request("POST", "/orders/checkout", SHIPPING)
+            recorder.record("POST /orders/checkout", elapsed, status)
+        client.close()
+
+    threads = [threading.Thread(target=buyer, args=(token,), daemon=True) for token in tokens]
+    for thread in threads:
+        thread.start()
+    start_line.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    report = recorder.report(time.perf_counter() - start)
+
+    sold = report.get("POST /orders/checkout", {}).get("status", {}).get("200", 0)
+    final_stock = product_stock(args.url, product_id)
+    report["stock"] = {"initial": args.stock, "sold": sold, "final": final_stock,
+                       "consistent": final_stock >= 0 and sold + final_stock == args.stock}
+    print(json.dumps(report, indent=2))
+    if not report["stock"]["consistent"]:
+        raise SystemExit("Estoque inconsistente: houve venda além do disponível")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,69 @@
+"""
+Benchmark de login: vazão do /auth/login e latência dos demais endpoints durante uma rajada
+
+Roda contra uma API já no ar. Primeiro mede GET /categories e GET /cart sozinhos; depois,
+com os mesmos leitores, dispara logins em paralelo. Com o bcrypt fora do threadpool, o p95
+dos leitores durante a rajada deve ficar próximo do medido sem ela.
+
+    python benchmarks/login_storm.py --url http://127.0.0.1:8000 --logins 32
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from common import PASSWORD, Client, Recorder, ensure_user
+
+USERNAME = "bench-login"
+
+def run_phase(url, token, readers, logins, duration):
+    """Leitores e (opcionalmente) logins em paralelo por `duration` segundos"""
+    stop = threading.Event()
+    recorder = Recorder()
+
+    def reader(index):
+        client = Client(url, token)
+        paths = ("/categories", "/cart")
+        while not stop.is_set():
+            elapsed, status, _ = client.request("GET", paths[index % len(paths)])
+            recorder.record("read", elapsed, status)
+            index += 1
+        client.close()
+
+    def login():
+        client = Client(url)
+        body = {"username": USERNAME, "password": PASSWORD}
+        while not stop.is_set():
+            elapsed, status, _ = client.request("POST", "/auth/login", body)
+            recorder.record("login", elapsed, status)
+        client.close()
+
+    threads = [threading.Thread(target=reader, args=(i,), daemon=True) for i in range(readers)]
+    threads += [threading.Thread(target=login, daemon=True) for _ in range(logins)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.perf_counter() - start)
+
+def run():
+    parser = argparse.ArgumentParser(description="Benchmark de login da E-Commerce API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--readers", type=int, default=8, help="clientes lendo /categories e /cart")
+    parser.add_argument("--logins", type=int, default=32, help="clientes fazendo login sem parar")
+    parser.add_argument("--duration", type=float, default=15, help="segundos por fase")
+    args = parser.parse_args()
+
+    token = ensure_user(args.url, USERNAME)
+    report = {
+        "baseline": run_phase(args.url, token, args.readers, 0, args.duration),
+        "storm": run_phase(args.url, token, args.readers, args.logins, args.duration),
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    run()
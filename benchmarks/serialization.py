@@ -0,0 +1,75 @@
+"""
+Micro-benchmark de serialização: custo por linha do response_model vs. render_json (orjson)
+
+Não precisa de banco nem da API no ar: serializa linhas sintéticas de produtos, itens do
+carrinho e pedidos pelos dois caminhos e confere que a saída é idêntica byte a byte.
+
+    python benchmarks/serialization.py --rows 5000 --rounds 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import main  # noqa: E402
+
+def sample_rows(rows):
+    now = datetime.now().replace(microsecond=0)
+    return {
+        main.Product: [{"id": i, "name": f"Produto {i}", "description": "Descrição " * 5,
+                        "price": Decimal("199.90"), "stock": 10, "category_id": 1,
+                        "image_url": None, "created_at": now} for i in range(rows)],
+        main.CartItem: [{"id": i, "user_id": 1, "product_id": i, "quantity": 2, "product_name": f"Produto {i}",
+                         "product_price": Decimal("19.90"), "total_price": Decimal("39.80")}
+                        for i in range(rows)],
+        # Um pedido com 3 itens por "linha"
+        main.Order: [{"id": i, "user_id": 1, "total_amount": Decimal("59.70"), "shipping_address": "Rua A, 1",
+                      "payment_method": "pix", "status": "pending", "created_at": now,
+                      "items": [{"product_id": j, "quantity": 1, "price": Decimal("19.90")} for j in range(3)]}
+                     for i in range(rows)],
+    }
+
+def response_model_path(model, data):
+    """O que o endpoint fazia: instancia os modelos e o response_model serializa de novo"""
+    return JSONResponse(jsonable_encoder([model(**row) for row in data])).body
+
+def orjson_path(model, data):
+    convert = main.row_converter(model)
+    return main.orjson.dumps([convert(row) for row in data])
+
+def measure(func, model, data, rounds):
+    func(model, data)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(model, data)
+    return round((time.perf_counter() - start) / (len(data) * rounds) * 1e6, 3)
+
+def run():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de serialização da E-Commerce API")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    report = {}
+    for model, data in sample_rows(args.rows).items():
+        before = measure(response_model_path, model, data, args.rounds)
+        after = measure(orjson_path, model, data, args.rounds)
+        report[model.__name__] = {
+            "response_model_us_per_row": before,
+            "orjson_us_per_row": after,
+            "speedup": round(before / after, 2) if after else None,
+            "identical": response_model_path(model, data) == orjson_path(model, data),
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    run()
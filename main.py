@@ -4,24 +4,96 @@ FastAPI + MySQL/XAMPP
 Autor: Assistente IA
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, EmailStr, Field, ValidationError
 from passlib.context import CryptContext
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import mysql.connector
-from mysql.connector import Error
-from typing import List, Optional
+from anyio import to_thread
+from mysql.connector import Error, errorcode
+from typing import List, Optional, Union, get_args, get_origin
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import bisect
+import contextvars
+import csv
+import hmac
+import io
+import hashlib
+import json
+import math
 import os
+import random
+import re
+import threading
+import time
+import uuid
+import unicodedata
 from decimal import Decimal
+import orjson
 
 # Configurações
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Cache de usuários autenticados e de tokens decodificados
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '60'))
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+
+# Cache de leitura do catálogo (categorias e produtos individuais)
+CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', '5000'))
+CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', '300'))
+
+# Serialização direta das linhas do banco com orjson (mesma saída do response_model)
+FAST_JSON = os.getenv('FAST_JSON', 'true').lower() in ('1', 'true', 'yes')
+
+# Exportação em streaming (desabilitada enquanto EXPORT_API_KEY não for definida)
+EXPORT_API_KEY = os.getenv('EXPORT_API_KEY', '')
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))
+
+# Relatório de vendas (/analytics/sales), servido só pelos rollups; sem chave fica desabilitado
+ANALYTICS_API_KEY = os.getenv('ANALYTICS_API_KEY', EXPORT_API_KEY)
+ANALYTICS_MAX_DAYS = int(os.getenv('ANALYTICS_MAX_DAYS', '366'))
+
+# Importação em lote de produtos
+BULK_IMPORT_BATCH_SIZE = int(os.getenv('BULK_IMPORT_BATCH_SIZE', '500'))
+BULK_IMPORT_MAX_ERRORS = int(os.getenv('BULK_IMPORT_MAX_ERRORS', '1000'))
+
+# Profiler de SQL por requisição (opt-in): registra cada comando e loga requisições acima dos limites
+DB_PROFILE = os.getenv('DB_PROFILE', 'false').lower() in ('1', 'true', 'yes')
+PROFILE_MAX_QUERIES = int(os.getenv('PROFILE_MAX_QUERIES', '20'))
+PROFILE_MAX_REPEATS = int(os.getenv('PROFILE_MAX_REPEATS', '5'))
+PROFILE_MAX_DB_MS = float(os.getenv('PROFILE_MAX_DB_MS', '100'))
+PROFILE_EXPLAIN = os.getenv('PROFILE_EXPLAIN', 'true').lower() in ('1', 'true', 'yes')
+
+# Hash de senhas (bcrypt) em pool dedicado
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', str(os.cpu_count() or 2)))
+HASH_QUEUE_SIZE = int(os.getenv('HASH_QUEUE_SIZE', '32'))
+
+# Processos da API (gunicorn e uvicorn leem WEB_CONCURRENCY) e sincronização dos caches em
+# memória entre eles; ligada por padrão quando há mais de um processo
+API_WORKERS = int(os.getenv('WEB_CONCURRENCY', '1'))
+CACHE_SYNC = os.getenv('CACHE_SYNC', str(API_WORKERS > 1)).lower() in ('1', 'true', 'yes')
+CACHE_SYNC_INTERVAL = float(os.getenv('CACHE_SYNC_INTERVAL', '1'))
+CACHE_SYNC_GAP_TIMEOUT = float(os.getenv('CACHE_SYNC_GAP_TIMEOUT', '30'))
+CACHE_SYNC_BATCH = int(os.getenv('CACHE_SYNC_BATCH', '1000'))
+CACHE_SYNC_RETENTION = int(os.getenv('CACHE_SYNC_RETENTION', '3600'))  # segundos
+CACHE_SYNC_PRUNE_INTERVAL = 600
+
 # Configurações do banco de dados MySQL
 DB_CONFIG = {
     'host': os.getenv('DB_HOST', 'localhost'),
@@ -32,6 +104,19 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
+# Réplica de leitura opcional: sem DB_REPLICA_HOST todo o tráfego vai para o primário
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST', '')
+DB_REPLICA_CONFIG = {
+    **DB_CONFIG,
+    'host': DB_REPLICA_HOST,
+    'port': int(os.getenv('DB_REPLICA_PORT', str(DB_CONFIG['port']))),
+    'user': os.getenv('DB_REPLICA_USER', DB_CONFIG['user']),
+    'password': os.getenv('DB_REPLICA_PASSWORD', DB_CONFIG['password']),
+} if DB_REPLICA_HOST else None
+# Por quantos segundos após uma escrita as leituras do mesmo usuário (ou do mesmo item do
+# catálogo) continuam no primário; deve cobrir o atraso de replicação esperado
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+
 # Inicialização do FastAPI
 app = FastAPI(
     title="E-Commerce API",
@@ -39,18 +124,15 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # Configuração de segurança
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+optional_security = HTTPBearer(auto_error=False)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# O bcrypt libera o GIL, então threads bastam para tirá-lo do caminho das outras requisições.
+# O semáforo limita trabalhos em execução + na fila; acima disso respondemos 503.
+hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_SIZE)
 
 # Modelos Pydantic
 class UserCreate(BaseModel):
@@ -92,6 +174,15 @@ class ProductCreate(BaseModel):
     category_id: int
     image_url: Optional[str] = None
 
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkImportError]
+
 class Product(BaseModel):
     id: int
     name: str
@@ -104,7 +195,14 @@ class Product(BaseModel):
 
 class CartItemCreate(BaseModel):
     product_id: int
-    quantity: int
+    quantity: int = Field(gt=0)
+
+class CartItemSet(BaseModel):
+    product_id: int
+    quantity: int = Field(ge=0)  # 0 remove o produto do carrinho
+
+class CartBatch(BaseModel):
+    items: List[CartItemSet]
 
 class CartItem(BaseModel):
     id: int
@@ -115,6 +213,10 @@ class CartItem(BaseModel):
     product_price: Decimal
     total_price: Decimal
 
+class OrderStatus(BaseModel):
+    id: int
+    status: str
+
 class OrderCreate(BaseModel):
     shipping_address: str
     payment_method: str
@@ -134,612 +236,3741 @@ class Order(BaseModel):
     created_at: datetime
     items: List[OrderItem]
 
-# Funções de banco de dados
-def get_db_connection():
-    """Cria conexão com o banco de dados MySQL"""
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
-    except Error as e:
-        print(f"Erro ao conectar com MySQL: {e}")
-        return None
+class SalesDay(BaseModel):
+    day: date
+    orders: int
+    units: int
+    revenue: Decimal
 
-def init_database():
-    """Inicializa o banco de dados e cria as tabelas"""
+class ProductSales(BaseModel):
+    product_id: int
+    product_name: Optional[str] = None
+    units: int
+    revenue: Decimal
+
+class CategorySales(BaseModel):
+    category_id: Optional[int] = None  # None = produtos sem categoria
+    category_name: Optional[str] = None
+    units: int
+    revenue: Decimal
+
+class SalesReport(BaseModel):
+    start: date
+    end: date
+    orders: int
+    units: int
+    revenue: Decimal
+    days: List[SalesDay]
+    products: List[ProductSales]
+    categories: List[CategorySales]
+
+# Métricas (formato texto do Prometheus), coletadas no próprio processo
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(labelnames, values, extra=""):
+    pairs = [f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+             for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}  # labels -> [contagem por bucket..., +Inf, soma]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(entry)) for labels, entry in self._values.items())
+        for labels, entry in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), entry[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {entry[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+def sample_lines(name, documentation, samples, kind="gauge"):
+    """Métrica lida na hora da coleta: samples é uma lista de (labels dict, valor)"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return lines
+
+http_requests_total = Counter("http_requests_total", "Requisições HTTP atendidas",
+                              ("method", "route", "status"))
+http_request_duration = Histogram("http_request_duration_seconds", "Latência das requisições HTTP",
+                                  ("method", "route"))
+db_queries_total = Counter("db_queries_total", "Comandos SQL executados", ("operation",))
+db_query_duration = Histogram("db_query_duration_seconds", "Duração dos comandos SQL", ("operation",))
+http_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+class MetricsMiddleware:
+    """Middleware ASGI que mede latência, status e requisições em andamento por rota"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global http_in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with _in_flight_lock:
+            http_in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            with _in_flight_lock:
+                http_in_flight -= 1
+            # Usa o molde da rota (/products/{product_id}) para não explodir a cardinalidade
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_requests_total.inc((method, route_path, str(status_code)))
+            http_request_duration.observe((method, route_path), elapsed)
+
+def _sql_operation(statement) -> str:
+    if isinstance(statement, bytes):
+        statement = statement.decode(errors="replace")
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+class InstrumentedCursor:
+    """Cursor que mede cada comando executado; o resto é delegado ao cursor original"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._profiled = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, method, operation, params, many=False):
+        profile = current_profile.get() if DB_PROFILE else None
+        if self._profiled is not None:
+            _settle_rows(self._profiled)
+        started = time.perf_counter()
+        try:
+            return method(operation, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            kind = _sql_operation(operation)
+            db_queries_total.inc((kind,))
+            db_query_duration.observe((kind,), elapsed)
+            if profile is not None:
+                self._profiled = profile.record(self._cursor, operation, params, elapsed, many)
+
+    def execute(self, operation, params=()):
+        return self._timed(self._cursor.execute, operation, params)
+
+    def executemany(self, operation, seq_params):
+        return self._timed(self._cursor.executemany, operation, seq_params, many=True)
+
+# Profiler de SQL por requisição (DB_PROFILE)
+current_profile = contextvars.ContextVar("current_profile", default=None)
+_IN_LIST = re.compile(r"\bIN \(%s(?:\s*,\s*%s)*\)", re.IGNORECASE)
+
+def _settle_rows(entry):
+    # Cursores sem buffer só sabem quantas linhas devolveram depois da leitura: o rowcount é
+    # lido quando o cursor executa o próximo comando ou quando a requisição termina
+    cursor = entry.pop("cursor", None)
+    if cursor is not None:
+        entry["rows"] = cursor.rowcount
+
+class QueryProfile:
+    """Comandos SQL executados durante uma requisição, com duração e linhas afetadas/lidas"""
+
+    def __init__(self):
+        self.statements = []
+
+    def record(self, cursor, operation, params, elapsed, many=False):
+        if isinstance(operation, bytes):
+            operation = operation.decode(errors="replace")
+        sql = " ".join(operation.split())
+        entry = {"sql": sql, "shape": _IN_LIST.sub("IN (...)", sql), "ms": round(elapsed * 1000, 3),
+                 "rows": None, "params": None if many else params, "many": many, "cursor": cursor}
+        self.statements.append(entry)
+        return entry
+
+    def report(self, scope, status_code, elapsed):
+        """Resumo estruturado da requisição, ou None se ela ficou dentro dos limites"""
+        for entry in self.statements:
+            _settle_rows(entry)
+        db_ms = sum(entry["ms"] for entry in self.statements)
+        shapes = {}
+        for entry in self.statements:
+            count, total = shapes.get(entry["shape"], (0, 0.0))
+            shapes[entry["shape"]] = (count + 1, total + entry["ms"])
+        max_repeats = max((count for count, _ in shapes.values()), default=0)
+
+        reasons = []
+        if len(self.statements) > PROFILE_MAX_QUERIES:
+            reasons.append("queries")
+        if max_repeats > PROFILE_MAX_REPEATS:
+            reasons.append("repeated")
+        if db_ms > PROFILE_MAX_DB_MS:
+            reasons.append("db_time")
+        if not reasons:
+            return None
+
+        route = scope.get("route")
+        slowest = sorted(self.statements, key=lambda entry: entry["ms"], reverse=True)[:5]
+        return {
+            "event": "slow_request",
+            "method": scope["method"],
+            "route": route.path if route is not None else "unmatched",
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round(elapsed * 1000, 3),
+            "reasons": reasons,
+            "queries": len(self.statements),
+            "db_ms": round(db_ms, 3),
+            "rows": sum(entry["rows"] for entry in self.statements if entry["rows"] and entry["rows"] > 0),
+            "repeated": [{"sql": shape, "count": count, "ms": round(total, 3)}
+                         for shape, (count, total) in sorted(shapes.items(), key=lambda item: -item[1][0])
+                         if count > PROFILE_MAX_REPEATS],
+            "slowest": [{"sql": entry["sql"], "ms": entry["ms"], "rows": entry["rows"]} for entry in slowest],
+        }
+
+    def offenders(self, report):
+        """Um exemplo de cada comando repetido e os mais lentos, para o EXPLAIN"""
+        wanted = [item["sql"] for item in report["repeated"]]
+        if "db_time" in report["reasons"] or not wanted:
+            wanted.extend(item["sql"] for item in report["slowest"][:3])
+        chosen = {}
+        for entry in self.statements:
+            key = entry["shape"] if entry["shape"] in wanted else entry["sql"]
+            if key in wanted and key not in chosen and not entry["many"] \
+                    and _sql_operation(entry["sql"]) != "OTHER":
+                chosen[key] = entry
+        return list(chosen.values())
+
+def explain_statements(entries) -> List[dict]:
+    """Roda EXPLAIN dos comandos informados numa conexão do pool (fora da requisição original)"""
     connection = get_db_connection()
     if not connection:
-        return False
-    
+        return []
+    plans = []
+    cursor = connection.cursor(dictionary=True)
     try:
-        cursor = connection.cursor()
-        
-        # Usar apenas o banco já configurado em DB_CONFIG; não criar database aqui
-        
-        # Criar tabelas
-        tables = [
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                full_name VARCHAR(100) NOT NULL,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS categories (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS products (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(200) NOT NULL,
-                description TEXT NOT NULL,
-                price DECIMAL(10,2) NOT NULL,
-                stock INT NOT NULL DEFAULT 0,
-                category_id INT,
-                image_url VARCHAR(500),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (category_id) REFERENCES categories(id)
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS cart_items (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                product_id INT NOT NULL,
-                quantity INT NOT NULL DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (product_id) REFERENCES products(id),
-                UNIQUE KEY unique_user_product (user_id, product_id)
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS orders (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                total_amount DECIMAL(10,2) NOT NULL,
-                shipping_address TEXT NOT NULL,
-                payment_method VARCHAR(50) NOT NULL,
-                status VARCHAR(20) DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS order_items (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                order_id INT NOT NULL,
-                product_id INT NOT NULL,
-                quantity INT NOT NULL,
-                price DECIMAL(10,2) NOT NULL,
-                FOREIGN KEY (order_id) REFERENCES orders(id),
-                FOREIGN KEY (product_id) REFERENCES products(id)
-            )
-            """
-        ]
-        
-        for table in tables:
-            cursor.execute(table)
-        
-        connection.commit()
-        print("Banco de dados inicializado com sucesso!")
-        return True
-        
-    except Error as e:
-        print(f"Erro ao inicializar banco de dados: {e}")
-        return False
+        for entry in entries:
+            try:
+                cursor.execute("EXPLAIN " + entry["sql"], entry["params"])
+                plans.append({"sql": entry["sql"], "plan": cursor.fetchall()})
+            except Error as e:
+                plans.append({"sql": entry["sql"], "error": str(e)})
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        cursor.close()
+        connection.close()
+    return plans
 
-# Funções de autenticação
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+class QueryProfilerMiddleware:
+    """Middleware ASGI que perfila o SQL de cada requisição e loga (JSON) as que passam dos limites"""
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+    def __init__(self, app):
+        self.app = app
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
+        profile = QueryProfile()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(len(profile.statements)).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+        # A resposta já foi enviada: o EXPLAIN não atrasa o cliente
+        report = profile.report(scope, status_code, time.perf_counter() - started)
+        if report is not None:
+            if PROFILE_EXPLAIN:
+                report["explain"] = await run_in_threadpool(explain_statements, profile.offenders(report))
+            print(json.dumps(report, default=str, ensure_ascii=False), flush=True)
+
+
+# Pool de conexões MySQL
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+DB_POOL_PING_INTERVAL = int(os.getenv('DB_POOL_PING_INTERVAL', '30'))
+
+# Os endpoints que acessam o banco são síncronos e rodam no threadpool do FastAPI,
+# limitado a API_THREADPOOL_SIZE threads; o event loop nunca bloqueia em uma query.
+API_THREADPOOL_SIZE = int(os.getenv('API_THREADPOOL_SIZE', '40'))
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou disponível dentro do tempo limite do pool"""
+
+class PooledConnection:
+    """Conexão emprestada do pool; close() devolve a conexão em vez de fechá-la"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+        self._invalid = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._raw.cursor(*args, **kwargs))
+
+    def invalidate(self):
+        """Marca a conexão para ser descartada na devolução (ex.: resultado pendente grande)"""
+        self._invalid = True
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self)
+
+class ConnectionPool:
+    """Pool de conexões com overflow, timeout de checkout, validação e reciclagem"""
+
+    def __init__(self, config, pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_MAX_OVERFLOW,
+                 timeout=DB_POOL_TIMEOUT, recycle=DB_POOL_RECYCLE, pre_ping=DB_POOL_PRE_PING,
+                 ping_interval=DB_POOL_PING_INTERVAL):
+        self.config = config
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.ping_interval = ping_interval
+        self._idle = deque()  # (conexão, criada_em, devolvida_em)
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._counters = {
+            'checkouts': 0,
+            'connects': 0,
+            'timeouts': 0,
+            'recycled': 0,
+            'invalidated': 0,
+            'wait_time_total': 0.0,
+        }
+
+    def _connect(self):
+        raw = mysql.connector.connect(**self.config)
+        with self._cond:
+            self._counters['connects'] += 1
+        return raw
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Error:
+            pass
+
+    def _is_usable(self, raw, created_at, returned_at):
+        """Aplica a política de reciclagem e validação no empréstimo (chamado fora do lock)"""
+        now = time.monotonic()
+        if self.recycle and now - created_at > self.recycle:
+            with self._cond:
+                self._counters['recycled'] += 1
+            return False
+        if self.pre_ping and now - returned_at > self.ping_interval:
+            try:
+                raw.ping(reconnect=False)
+            except Error:
+                with self._cond:
+                    self._counters['invalidated'] += 1
+                return False
+        return True
+
+    def acquire(self):
+        """Empresta uma conexão, esperando até `timeout` segundos se o pool estiver esgotado"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._idle:
+                        # Tira a conexão ociosa do pool já reservando a vaga; o ping (que pode
+                        # travar em uma conexão meio morta) e o close acontecem fora do lock
+                        raw, created_at, returned_at = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._open < self.pool_size + self.max_overflow:
+                        # Reserva a vaga antes de conectar fora do lock
+                        self._open += 1
+                        self._in_use += 1
+                        raw = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Pool esgotado: {self._in_use} conexões em uso após {self.timeout}s"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+            if raw is None:
+                break
+            if self._is_usable(raw, created_at, returned_at):
+                with self._cond:
+                    self._counters['checkouts'] += 1
+                    self._counters['wait_time_total'] += time.monotonic() - started
+                return PooledConnection(self, raw, created_at)
+            self._discard(raw)
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._counters['checkouts'] += 1
+            self._counters['wait_time_total'] += time.monotonic() - started
+        return PooledConnection(self, raw, time.monotonic())
+
+    def release(self, pooled):
+        """Devolve a conexão ao pool, descartando-a se estiver quebrada ou sobrando"""
+        raw = pooled._raw
+        healthy = not pooled._invalid
+        if healthy:
+            try:
+                if raw.unread_result:
+                    raw.consume_results()
+                if raw.in_transaction:
+                    raw.rollback()
+            except Error:
+                healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and len(self._idle) < self.pool_size:
+                self._idle.append((raw, pooled._created_at, time.monotonic()))
+                raw = None
+            else:
+                self._open -= 1
+                if not healthy:
+                    self._counters['invalidated'] += 1
+            self._cond.notify()
+        if raw is not None:
+            self._discard(raw)
+
+    def prefill(self):
+        """Abre conexões até `pool_size`, para que as primeiras requisições não paguem o connect"""
+        # Empresta todas as vagas livres de uma vez (as ociosas e as que faltam abrir) e devolve
+        borrowed = []
+        with self._cond:
+            opened = self._open
+            free = self.pool_size - self._in_use
+        try:
+            for _ in range(max(0, free)):
+                borrowed.append(self.acquire())
+        finally:
+            for pooled in borrowed:
+                self.release(pooled)
+        with self._cond:
+            return max(0, self._open - opened)
+
+    def dispose(self):
+        """Fecha todas as conexões ociosas"""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+    @property
+    def in_use(self) -> int:
+        """Conexões emprestadas (leitura sem lock, usada no controle de admissão)"""
+        return self._in_use
+
+    @property
+    def waiting(self) -> int:
+        """Threads esperando uma conexão (leitura sem lock, usada no controle de admissão)"""
+        return self._waiting
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'overflow': max(0, self._open - self.pool_size),
+                'waiting': self._waiting,
+                **self._counters,
+            }
+
+db_pool = ConnectionPool(DB_CONFIG)
+replica_pool = ConnectionPool(DB_REPLICA_CONFIG) if DB_REPLICA_CONFIG else None
+replica_fallbacks_total = Counter("db_replica_fallbacks_total",
+                                  "Leituras desviadas para o primário com a réplica fora do ar")
+
+# Funções de banco de dados
+def get_db_connection():
+    """Empresta uma conexão do pool MySQL"""
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    connection = get_db_connection()
-    if not connection:
+        return db_pool.acquire()
+    except (Error, PoolTimeoutError) as e:
+        print(f"Erro ao conectar com MySQL: {e}")
+        return None
+
+def acquire_from(pool: ConnectionPool) -> PooledConnection:
+    """Empresta do pool pedido; se a réplica estiver fora do ar, a leitura vai para o primário"""
+    try:
+        return pool.acquire()
+    except Error:
+        if pool is db_pool:
+            raise
+        replica_fallbacks_total.inc()
+        return db_pool.acquire()
+
+@contextmanager
+def borrow_connection(pool: Optional[ConnectionPool] = None):
+    """Empresta uma conexão (do primário, por padrão), traduzindo falhas em respostas HTTP"""
+    try:
+        connection = acquire_from(pool or db_pool)
+    except PoolTimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database busy, try again",
+            headers={"Retry-After": "1"},
+        )
+    except Error:
         raise HTTPException(status_code=500, detail="Database connection error")
-    
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        if user is None:
-            raise credentials_exception
-        return User(**user)
+        yield connection
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        connection.close()
 
-# Endpoints de autenticação
-@app.post("/auth/register", response_model=User)
-async def register_user(user: UserCreate):
-    """Registra um novo usuário"""
-    connection = get_db_connection()
-    if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    
+def get_db():
+    """Dependência que empresta uma conexão por requisição ao endpoint"""
+    with borrow_connection() as connection:
+        yield connection
+
+# Limite por cliente (token bucket) e controle de admissão global
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+# Sem admissão: leituras baratas do catálogo e health checks continuam sendo atendidas na sobrecarga
+ADMISSION_EXEMPT_PREFIXES = ("/health", "/metrics", "/products", "/categories", "/docs", "/redoc", "/openapi.json")
+# Conexões do pool em uso a partir das quais as rotas não isentas são recusadas; o restante
+# fica de reserva para as isentas
+ADMISSION_MAX_IN_USE = int(os.getenv('ADMISSION_MAX_IN_USE',
+                                     str(max(1, (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW) * 3 // 4))))
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', str(DB_POOL_SIZE)))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '1'))
+
+class RateLimiter:
+    """Token bucket por cliente: rajadas de até `capacity` requisições, repostas ao longo de `period` segundos"""
+
+    def __init__(self, capacity: int, period: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # chave -> (fichas, atualizado_em)
+        self._lock = threading.Lock()
+
+    def acquire(self, key) -> float:
+        """Consome uma ficha; devolve 0 se a requisição passa ou os segundos até a próxima ficha"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            # O bucket mais antigo já estaria cheio de novo, então descartá-lo não afrouxa o limite
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+def parse_rate_limit(value: str) -> RateLimiter:
+    """"10/60" = 10 requisições a cada 60 segundos"""
+    capacity, period = value.split("/")
+    return RateLimiter(int(capacity), float(period))
+
+RATE_LIMITS = {
+    "login": parse_rate_limit(os.getenv('RATE_LIMIT_LOGIN', '10/60')),
+    "register": parse_rate_limit(os.getenv('RATE_LIMIT_REGISTER', '5/60')),
+    "checkout": parse_rate_limit(os.getenv('RATE_LIMIT_CHECKOUT', '10/60')),
+}
+
+rate_limited_total = Counter("http_rate_limited_total", "Requisições recusadas pelo limite por cliente",
+                             ("limit",))
+admission_rejected_total = Counter("http_admission_rejected_total",
+                                   "Requisições recusadas pelo controle de admissão", ("reason",))
+
+def enforce_rate_limit(name: str, key):
+    if not RATE_LIMIT_ENABLED:
+        return
+    wait = RATE_LIMITS[name].acquire(key)
+    if wait:
+        rate_limited_total.inc((name,))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, try again later",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+def rate_limit_by_ip(name: str):
+    """Dependência para rotas sem login: o cliente é o IP (use --proxy-headers atrás de proxy)"""
+    def dependency(request: Request):
+        enforce_rate_limit(name, request.client.host if request.client else "unknown")
+    return dependency
+
+def rate_limit_by_user(name: str):
+    """Dependência para rotas autenticadas: o cliente é o usuário (get_current_user é resolvido uma vez só)"""
+    def dependency(current_user: User = Depends(get_current_user)):
+        enforce_rate_limit(name, current_user.id)
+    return dependency
+
+class AdmissionMiddleware:
+    """Middleware ASGI que recusa com 503 quando o banco está saturado, antes de a requisição pegar conexão.
+
+    A decisão olha o pool (conexões em uso e threads esperando uma), e não as requisições em
+    andamento: rotas que não usam o banco, ou que já devolveram a conexão e esperam o bcrypt,
+    não contam, e os workers de jobs, que usam o mesmo pool, contam.
+    """
+
+    def __init__(self, app, max_in_use: int = ADMISSION_MAX_IN_USE, max_queue: int = ADMISSION_MAX_QUEUE):
+        self.app = app
+        self.max_in_use = max_in_use
+        self.max_queue = max_queue
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._exempt(scope):
+            await self.app(scope, receive, send)
+            return
+
+        reason = None
+        if db_pool.in_use >= self.max_in_use:
+            reason = "in_use"
+        elif self.max_queue and db_pool.waiting >= self.max_queue:
+            reason = "queue"
+        if reason is not None:
+            admission_rejected_total.inc((reason,))
+            response = JSONResponse(
+                {"detail": "Service overloaded, try again"},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _exempt(scope) -> bool:
+        method = scope["method"]
+        if method == "OPTIONS":
+            return True
+        path = scope["path"]
+        return method in ("GET", "HEAD") and (path == "/" or path.startswith(ADMISSION_EXEMPT_PREFIXES))
+
+# Middlewares: o último registrado é o mais externo. A admissão fica dentro do CORS para que
+# as respostas 503 cheguem ao navegador, e as métricas ficam por fora de tudo.
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Query-Count"],
+)
+if DB_PROFILE:
+    app.add_middleware(QueryProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# Migrações versionadas do schema
+def table_indexes(cursor, table: str) -> dict:
+    """Índices da tabela: nome -> lista de colunas, na ordem do índice"""
+    cursor.execute("""
+        SELECT index_name, column_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY index_name, seq_in_index
+    """, (table,))
+    indexes = {}
+    for index_name, column_name in cursor.fetchall():
+        indexes.setdefault(index_name, []).append(column_name.lower())
+    return indexes
+
+def _index_columns(columns: str) -> List[str]:
+    return [column.strip().lower() for column in columns.split(",")]
+
+def create_index(table: str, name: str, columns: str):
+    """Passo de migração que cria um índice, a menos que já exista um (com qualquer nome, como o que
+    o InnoDB cria para uma FOREIGN KEY) que comece pelas mesmas colunas"""
+    wanted = _index_columns(columns)
+    def step(cursor):
+        existing = table_indexes(cursor, table)
+        if not any(cols[:len(wanted)] == wanted for cols in existing.values()):
+            cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    return step
+
+def add_column(table: str, name: str, definition: str):
+    """Passo de migração que acrescenta uma coluna se ela ainda não existir"""
+    def step(cursor):
+        cursor.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+            LIMIT 1
+        """, (table, name))
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+    return step
+
+# (versão, descrição, passos). Passos são SQL ou funções que recebem o cursor.
+# DDL faz commit implícito no MySQL, então todo passo precisa poder ser reexecutado.
+# Nunca altere uma migração já publicada: acrescente uma nova versão.
+MIGRATIONS = [
+    (1, "schema inicial", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            full_name VARCHAR(100) NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS categories (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            description TEXT NOT NULL,
+            price DECIMAL(10,2) NOT NULL,
+            stock INT NOT NULL DEFAULT 0,
+            category_id INT,
+            image_url VARCHAR(500),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS cart_items (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            product_id INT NOT NULL,
+            quantity INT NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (product_id) REFERENCES products(id),
+            UNIQUE KEY unique_user_product (user_id, product_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS orders (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            total_amount DECIMAL(10,2) NOT NULL,
+            shipping_address TEXT NOT NULL,
+            payment_method VARCHAR(50) NOT NULL,
+            status VARCHAR(20) DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            order_id INT NOT NULL,
+            product_id INT NOT NULL,
+            quantity INT NOT NULL,
+            price DECIMAL(10,2) NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES orders(id),
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+        """
+    ]),
+    (2, "índices de listagem de produtos e pedidos", [
+        create_index("products", "idx_products_name", "name"),
+        create_index("products", "idx_products_price", "price"),
+        create_index("products", "idx_products_created", "created_at"),
+        create_index("products", "idx_products_category_name", "category_id, name"),
+        create_index("products", "idx_products_category_price", "category_id, price"),
+        create_index("products", "idx_products_category_created", "category_id, created_at"),
+        create_index("orders", "idx_orders_user_created", "user_id, created_at"),
+    ]),
+    (3, "índice do carrinho", [
+        # order_items(order_id) já tem o índice da FOREIGN KEY, que atende os itens de GET /orders
+        create_index("cart_items", "idx_cart_items_user_created", "user_id, created_at"),
+    ]),
+    (4, "fila de jobs", [
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            payload TEXT NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            attempts INT NOT NULL DEFAULT 0,
+            max_attempts INT NOT NULL DEFAULT 5,
+            run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            claimed_by VARCHAR(64),
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        create_index("jobs", "idx_jobs_status_run", "status, run_at"),
+    ]),
+    (5, "invalidações de cache entre processos", [
+        """
+        CREATE TABLE IF NOT EXISTS cache_invalidations (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            origin VARCHAR(64),
+            scope VARCHAR(20) NOT NULL,
+            cache_key VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        create_index("cache_invalidations", "idx_cache_invalidations_created", "created_at"),
+    ]),
+    (6, "rollups de vendas", [
+        """
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            day DATE NOT NULL,
+            slot TINYINT NOT NULL,
+            orders INT NOT NULL DEFAULT 0,
+            units INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, slot)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_product_daily (
+            day DATE NOT NULL,
+            product_id INT NOT NULL,
+            slot TINYINT NOT NULL,
+            units INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, product_id, slot)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_category_daily (
+            day DATE NOT NULL,
+            category_id INT NOT NULL,
+            slot TINYINT NOT NULL,
+            units INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, category_id, slot)
+        )
+        """,
+    ]),
+    (7, "reservas de estoque e slots de produtos quentes", [
+        add_column("products", "stock_slots", "TINYINT NOT NULL DEFAULT 0"),
+        create_index("products", "idx_products_stock_slots", "stock_slots"),
+        """
+        CREATE TABLE IF NOT EXISTS inventory_slots (
+            product_id INT NOT NULL,
+            slot TINYINT NOT NULL,
+            stock INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (product_id, slot)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            user_id INT NOT NULL,
+            product_id INT NOT NULL,
+            quantity INT NOT NULL,
+            expires_at DATETIME NOT NULL,
+            PRIMARY KEY (user_id, product_id)
+        )
+        """,
+        create_index("stock_reservations", "idx_stock_reservations_expires", "expires_at"),
+    ]),
+]
+
+MIGRATION_LOCK = "ecommerce_schema_migrations"
+
+def current_schema_version(cursor) -> int:
     try:
-        cursor = connection.cursor()
-        
-        # Verificar se usuário já existe
-        cursor.execute("SELECT id FROM users WHERE username = %s OR email = %s", 
-                      (user.username, user.email))
-        if cursor.fetchone():
-            raise HTTPException(status_code=400, detail="Username or email already registered")
-        
-        # Criar usuário
-        password_hash = get_password_hash(user.password)
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        return cursor.fetchone()[0]
+    except Error as e:
+        if e.errno != errorcode.ER_NO_SUCH_TABLE:
+            raise
         cursor.execute("""
-            INSERT INTO users (username, email, password_hash, full_name)
-            VALUES (%s, %s, %s, %s)
-        """, (user.username, user.email, password_hash, user.full_name))
-        
-        connection.commit()
-        user_id = cursor.lastrowid
-        
-        # Retornar dados do usuário (sem senha)
-        cursor.execute("SELECT id, username, email, full_name, is_active FROM users WHERE id = %s", (user_id,))
-        user_data = cursor.fetchone()
-        
-        return User(**user_data)
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                description VARCHAR(200) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        return 0
+
+def run_migrations(connection) -> List[int]:
+    """Aplica as migrações pendentes e devolve as versões aplicadas; com o schema em dia custa uma consulta"""
+    cursor = connection.cursor()
+    try:
+        latest = MIGRATIONS[-1][0]
+        if current_schema_version(cursor) >= latest:
+            return []
         
-    except Error as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        # Vários processos podem subir ao mesmo tempo: só um aplica as migrações
+        cursor.execute("SELECT GET_LOCK(%s, 60)", (MIGRATION_LOCK,))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Timeout aguardando o lock de migração")
+        try:
+            current = current_schema_version(cursor)
+            applied = []
+            for version, description, steps in MIGRATIONS:
+                if version <= current:
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                               (version, description))
+                connection.commit()
+                print(f" Migração {version} aplicada: {description}")
+                applied.append(version)
+            return applied
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchone()
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        cursor.close()
 
-@app.post("/auth/login", response_model=Token)
-async def login_user(user: UserLogin):
-    """Faz login do usuário"""
+def init_database():
+    """Inicializa o banco de dados aplicando as migrações pendentes"""
     connection = get_db_connection()
     if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
+        return False
     
+    # Usar apenas o banco já configurado em DB_CONFIG; não criar database aqui
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE username = %s", (user.username,))
-        db_user = cursor.fetchone()
-        
-        if not db_user or not verify_password(user.password, db_user['password_hash']):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": db_user['username']}, expires_delta=access_token_expires
-        )
-        
-        return {"access_token": access_token, "token_type": "bearer"}
+        run_migrations(connection)
+        return True
         
-    except Error as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except (Error, RuntimeError) as e:
+        print(f"Erro ao inicializar banco de dados: {e}")
+        return False
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        connection.close()
 
-# Endpoints de categorias
-@app.post("/categories", response_model=Category)
-async def create_category(category: CategoryCreate, current_user: User = Depends(get_current_user)):
-    """Cria uma nova categoria"""
-    connection = get_db_connection()
-    if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    
+# Caches em memória
+class TTLCache:
+    """Cache LRU limitado em tamanho, com expiração por entrada e contadores de acerto.
+
+    Para carregar sem guardar valor velho: pegue `version()` antes de ler o banco e passe-a em
+    `set(..., since=)`. Se a chave foi invalidada (pop, pop_where, clear) nesse meio-tempo, o
+    valor lido é descartado em vez de ficar no cache até expirar.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self._version = 0
+        self._invalidated = OrderedDict()  # chave -> versão da última invalidação
+        self._floor = 0  # versão mais recente entre as invalidações já esquecidas
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def set(self, key, value, ttl=None, since=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            # Sem o registro da chave (já esquecido), qualquer invalidação posterior a `since` barra
+            if since is not None and self._invalidated.get(key, self._floor) > since:
+                return
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def _invalidate(self, key):
+        self._version += 1
+        self._invalidated[key] = self._version
+        self._invalidated.move_to_end(key)
+        while len(self._invalidated) > self.maxsize:
+            self._floor = self._invalidated.popitem(last=False)[1]
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            self._invalidate(key)
+        return entry[1] if entry else None
+
+    def pop_where(self, predicate):
+        """Remove as entradas cuja chave satisfaz o predicado"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+                self._invalidate(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._version += 1
+            self._invalidated.clear()
+            self._floor = self._version
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+def make_etag(body: bytes) -> str:
+    """ETag forte derivada do conteúdo da resposta"""
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Verifica se o If-None-Match da requisição casa com a ETag (comparação fraca, RFC 9110)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def prime_cache(cache: TTLCache, key, model, data, since=None):
+    """Guarda no cache o corpo JSON pronto e o ETag de `data` (lido do banco na versão `since`)"""
+    body = render_json(model, data)
+    entry = (body, make_etag(body))
+    cache.set(key, entry, since=since)
+    return entry
+
+def cached_json_response(request: Request, cache: TTLCache, key, model, load):
+    """Serve JSON a partir do cache (carregando com `load()` na falta), com ETag e 304"""
+    entry = cache.get(key)
+    if entry is None:
+        # Uma escrita que invalide a chave durante o load() impede que o valor lido seja guardado
+        since = cache.version()
+        entry = prime_cache(cache, key, model, load(), since)
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Serialização de respostas
+def _field_converter(annotation):
+    """Conversão de um valor do banco para o formato JSON do pydantic (None = usar como está)"""
+    origin = get_origin(annotation)
+    if origin is Union:
+        inner = _field_converter(next(arg for arg in get_args(annotation) if arg is not type(None)))
+        return None if inner is None else (lambda value: None if value is None else inner(value))
+    if origin is list:
+        convert = row_converter(get_args(annotation)[0])
+        return lambda items: [convert(item) for item in items]
+    if annotation is Decimal:
+        return str
+    if annotation is bool:
+        return bool
+    return None
+
+@lru_cache(maxsize=None)
+def row_converter(model):
+    """Função que transforma uma linha (dict) no dict serializável do modelo, na ordem dos campos"""
+    fields = [(name, _field_converter(field.annotation)) for name, field in model.model_fields.items()]
+
+    def convert(row):
+        return {name: row[name] if conv is None else conv(row[name]) for name, conv in fields}
+    return convert
+
+def render_json(model, data) -> bytes:
+    """Serializa uma linha ou lista de linhas do banco como o response_model faria, sem instanciar modelos"""
+    if not FAST_JSON:
+        if isinstance(data, list):
+            content = [model(**row) for row in data]
+        else:
+            content = model(**data)
+        return JSONResponse(jsonable_encoder(content)).body
+    convert = row_converter(model)
+    if isinstance(data, list):
+        return orjson.dumps([convert(row) for row in data])
+    return orjson.dumps(convert(data))
+
+def json_rows_response(model, data, headers: Optional[dict] = None) -> Response:
+    return Response(content=render_json(model, data), media_type="application/json", headers=headers)
+
+# Usuários indexados por (sub, exp) do token; tokens indexados pela string do JWT
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+token_cache = TTLCache(TOKEN_CACHE_SIZE, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+# Respostas prontas (corpo, ETag) do catálogo: ("categories",) e ("product", id)
+catalog_cache = TTLCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
+# Nome e preço por id de produto, usados pelo carrinho em memória (CART_BACKEND=memory)
+cart_product_cache = TTLCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
+
+def invalidate_catalog_cache(product_ids=(), categories: bool = False):
+    """Descarta do cache do catálogo os produtos alterados e, se pedido, a lista de categorias"""
+    keys = [("product", product_id) for product_id in product_ids]
+    if categories:
+        keys.append(("categories",))
+    for key in keys:
+        catalog_cache.pop(key)
+        if key[0] == "product":
+            cart_product_cache.pop(key[1])
+        # Sem isso o próximo load poderia ler da réplica o valor antigo e guardá-lo no cache
+        if replica_pool is not None:
+            recent_catalog_writes.set(key, True)
+
+# Leituras que toleram atraso de replicação vão para a réplica, exceto logo após escritas
+# do próprio usuário ou do item lido (read-your-writes). Os registros ficam em memória; com
+# CACHE_SYNC os outros processos recebem os dois tipos pelo cache_invalidations
+recent_writers = TTLCache(USER_CACHE_SIZE, READ_YOUR_WRITES_SECONDS)
+recent_catalog_writes = TTLCache(CATALOG_CACHE_SIZE, READ_YOUR_WRITES_SECONDS)
+
+def mark_user_write(username: str, connection=None):
+    """Manda as leituras do usuário para o primário por READ_YOUR_WRITES_SECONDS.
+
+    Chamada depois do commit da escrita. Com CACHE_SYNC, publica a marca para os outros
+    processos em uma transação própria na conexão informada.
+    """
+    if replica_pool is None:
+        return
+    recent_writers.set(username, True)
+    if connection is None or not CACHE_SYNC:
+        return
+    cursor = connection.cursor()
     try:
+        cache_sync.publish(cursor, "writer", [username])
+        connection.commit()
+    except Error as e:
+        print(f"Erro ao publicar escrita recente de {username}: {e}")
+    finally:
+        cursor.close()
+
+def read_pool(token: Optional[str] = None, catalog_key=None) -> ConnectionPool:
+    """Pool para uma leitura somente-leitura: a réplica, se houver e nada recente exigir o primário"""
+    if replica_pool is None:
+        return db_pool
+    if catalog_key is not None and recent_catalog_writes.get(catalog_key):
+        return db_pool
+    if token is not None:
+        try:
+            username = decode_token(token).get("sub")
+        except JWTError:
+            username = None  # o catálogo é público: token inválido não impede a leitura
+        if username is not None and recent_writers.get(username):
+            return db_pool
+    return replica_pool
+
+def get_read_db(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Dependência para endpoints de leitura do catálogo (réplica, com read-your-writes)"""
+    with borrow_connection(read_pool(credentials.credentials if credentials else None)) as connection:
+        yield connection
+
+# Índice de busca de produtos
+SEARCH_NAME_WEIGHT = 3.0
+SEARCH_PREFIX_WEIGHT = 0.5
+SEARCH_PREFIX_EXPANSION = 50
+SEARCH_STOPWORDS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na",
+    "nos", "nas", "um", "uma", "para", "por", "com", "sem", "the", "and", "of",
+}
+
+def tokenize(text: str) -> List[str]:
+    """Quebra o texto em termos minúsculos e sem acentos ("Câmera" -> "camera")"""
+    folded = unicodedata.normalize("NFKD", text or "")
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch)).lower()
+    return [t for t in re.findall(r"[a-z0-9]+", folded) if t not in SEARCH_STOPWORDS]
+
+class ProductSearchIndex:
+    """Índice invertido em memória sobre nome e descrição dos produtos"""
+
+    def __init__(self):
+        self._postings = {}  # termo -> {product_id: peso}
+        self._terms = []  # termos ordenados, para busca por prefixo
+        self._docs = {}  # product_id -> (category_id, termos do documento)
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._replay = None  # alterações feitas durante um build, reaplicadas no índice novo
+
+    @staticmethod
+    def _weights(name, description):
+        weights = {}
+        for term in tokenize(name):
+            weights[term] = weights.get(term, 0.0) + SEARCH_NAME_WEIGHT
+        for term in tokenize(description):
+            weights[term] = weights.get(term, 0.0) + 1.0
+        return weights
+
+    def build(self, rows):
+        """Reconstrói o índice a partir de linhas (id, name, description, category_id).
+
+        O índice novo é montado fora do lock e trocado de uma vez: as buscas continuam sendo
+        atendidas pelo índice antigo durante a reconstrução.
+        """
+        with self._build_lock:
+            with self._lock:
+                self._replay = []
+            try:
+                postings, docs = {}, {}
+                for product_id, name, description, category_id in rows:
+                    weights = self._weights(name, description)
+                    for term, weight in weights.items():
+                        postings.setdefault(term, {})[product_id] = weight
+                    docs[product_id] = (category_id, tuple(weights))
+                terms = sorted(postings)
+                with self._lock:
+                    replay = self._replay
+                    self._postings, self._terms, self._docs = postings, terms, docs
+                    for apply, args in replay:
+                        apply(*args)
+            finally:
+                with self._lock:
+                    self._replay = None
+
+    def add(self, product_id, name, description, category_id=None):
+        """Indexa (ou reindexa) um produto"""
+        weights = self._weights(name, description)
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self._add, (product_id, weights, category_id)))
+            self._add(product_id, weights, category_id)
+
+    def _add(self, product_id, weights, category_id):
+        self._remove(product_id)
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[product_id] = weight
+        self._docs[product_id] = (category_id, tuple(weights))
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self._remove, (product_id,)))
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        for term in doc[1]:
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def _expand(self, term):
+        """Termos do índice que começam com `term` (o próprio termo incluído)"""
+        start = bisect.bisect_left(self._terms, term)
+        matches = []
+        for candidate in self._terms[start:start + SEARCH_PREFIX_EXPANSION]:
+            if not candidate.startswith(term):
+                break
+            matches.append(candidate)
+        return matches
+
+    def search(self, query: str, limit: int = 20, category_id: Optional[int] = None) -> List[int]:
+        """Retorna ids de produtos que contêm todos os termos (exatos ou por prefixo), do mais relevante ao menos"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            total = len(self._docs) or 1
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for candidate in self._expand(term):
+                    postings = self._postings[candidate]
+                    idf = math.log(1 + total / len(postings))
+                    factor = 1.0 if candidate == term else SEARCH_PREFIX_WEIGHT
+                    # Depois do primeiro termo, só interessam produtos que já casaram
+                    if scores is not None and len(scores) < len(postings):
+                        pairs = ((pid, postings[pid]) for pid in scores if pid in postings)
+                    else:
+                        pairs = postings.items()
+                    for product_id, weight in pairs:
+                        score = weight * idf * factor
+                        if score > term_scores.get(product_id, 0.0):
+                            term_scores[product_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: scores[pid] + sc for pid, sc in term_scores.items() if pid in scores}
+                if not scores:
+                    return []
+            if category_id:
+                scores = {pid: sc for pid, sc in scores.items() if self._docs[pid][0] == category_id}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, _ in ranked[:limit]]
+
+    def stats(self):
+        with self._lock:
+            return {'documents': len(self._docs), 'terms': len(self._terms)}
+
+search_index = ProductSearchIndex()
+
+def build_search_index():
+    """Carrega todos os produtos no índice de busca (uma leitura na inicialização)"""
+    connection = get_db_connection()
+    if not connection:
+        return False
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT id, name, description, category_id FROM products")
+        search_index.build(cursor.fetchall())
+        return True
+    except Error as e:
+        print(f"Erro ao construir índice de busca: {e}")
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+# Coerência dos caches entre processos da API. Cada escrita que invalida cache grava também uma
+# linha em cache_invalidations, na mesma transação; os outros processos consultam as linhas novas
+# a cada CACHE_SYNC_INTERVAL e descartam as mesmas entradas. O id da linha serve de contador de
+# versão global: cada processo só lê o que veio depois do último id que aplicou.
+class CacheSync:
+    """Publica e aplica invalidações de cache entre processos (sem efeito com CACHE_SYNC desligado)"""
+
+    def __init__(self, interval: float = CACHE_SYNC_INTERVAL, gap_timeout: float = CACHE_SYNC_GAP_TIMEOUT,
+                 batch: int = CACHE_SYNC_BATCH):
+        self.interval = interval
+        self.gap_timeout = gap_timeout
+        self.batch = batch
+        self.origin = None
+        self.last_id = 0
+        self._seen = set()   # ids acima de last_id já aplicados
+        self._gaps = {}      # id ausente abaixo do maior visto -> quando foi notado
+        self._pruned_at = float("-inf")
+        self._stop = threading.Event()
+        self._thread = None
+        self.applied = 0
+        self.errors = 0
+
+    def publish(self, cursor, scope: str, keys=(None,)):
+        """Grava invalidações na transação corrente; os outros processos as aplicam após o commit.
+
+        Escopos: "product" (id), "categories", "writer"
+        (username que acabou de gravar, para o read-your-writes), "search"
+        (id do produto a reindexar, ou None para reconstruir o índice) e "search_since"
+        (indexar os produtos com id acima do informado, após uma carga).
+        """
+        if not CACHE_SYNC:
+            return
+        cursor.executemany("""
+            INSERT INTO cache_invalidations (origin, scope, cache_key) VALUES (%s, %s, %s)
+        """, [(self.origin, scope, None if key is None else str(key)) for key in keys])
+
+    # Ciclo de vida
+    def start(self):
+        if not CACHE_SYNC:
+            return
+        # Gerado aqui, e não na importação: com --preload todos os workers herdariam o mesmo valor
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+        with borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                # Os caches começam vazios: só interessa o que for gravado daqui em diante
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations")
+                self.last_id = cursor.fetchone()[0]
+            finally:
+                cursor.close()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="cache-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except (Error, HTTPException) as e:
+                self.errors += 1
+                print(f"Erro ao sincronizar caches: {e}")
+
+    # Aplicação
+    def poll(self):
+        """Aplica as invalidações gravadas por outros processos desde a última consulta"""
+        with borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("""
+                    SELECT id, origin, scope, cache_key FROM cache_invalidations
+                    WHERE id > %s ORDER BY id LIMIT %s
+                """, (self.last_id, self.batch))
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+            reindex = set()
+            since = None
+            for row_id, origin, scope, key in rows:
+                if row_id in self._seen:
+                    continue
+                self._seen.add(row_id)
+                if origin == self.origin:
+                    continue
+                self.applied += 1
+                if scope == "product":
+                    invalidate_catalog_cache([int(key)])
+                elif scope == "categories":
+                    invalidate_catalog_cache(categories=True)
+                elif scope == "writer":
+                    if replica_pool is not None:
+                        recent_writers.set(key, True)
+                elif scope == "search":
+                    reindex.add(None if key is None else int(key))
+                elif scope == "search_since":
+                    since = int(key) if since is None else min(since, int(key))
+            self._advance(time.monotonic())
+            if None in reindex:
+                build_search_index()
+            else:
+                if since is not None:
+                    reindex_products_since(connection, since)
+                if reindex:
+                    reindex_products(connection, reindex)
+            self._prune(connection)
+
+    def _advance(self, now: float):
+        # Os ids saem na ordem dos INSERTs, mas as transações podem confirmar fora de ordem: um id
+        # ausente abaixo do maior já visto pode ser uma transação ainda aberta. Ele continua sendo
+        # procurado até gap_timeout; depois disso é tratado como rollback.
+        top = max(self._seen, default=self.last_id)
+        while self.last_id < top:
+            next_id = self.last_id + 1
+            if next_id in self._seen:
+                self._seen.discard(next_id)
+                self._gaps.pop(next_id, None)
+            else:
+                noticed = self._gaps.setdefault(next_id, now)
+                if now - noticed < self.gap_timeout:
+                    break
+                del self._gaps[next_id]
+            self.last_id = next_id
+
+    def _prune(self, connection):
+        if time.monotonic() - self._pruned_at < CACHE_SYNC_PRUNE_INTERVAL:
+            return
+        self._pruned_at = time.monotonic()
         cursor = connection.cursor()
+        try:
+            cursor.execute("""
+                DELETE FROM cache_invalidations WHERE created_at < NOW() - INTERVAL %s SECOND LIMIT 10000
+            """, (CACHE_SYNC_RETENTION,))
+            connection.commit()
+        finally:
+            cursor.close()
+
+    def stats(self) -> dict:
+        return {'enabled': CACHE_SYNC, 'last_id': self.last_id, 'applied': self.applied,
+                'pending_gaps': len(self._gaps), 'errors': self.errors}
+
+cache_sync = CacheSync()
+
+def max_product_id(connection) -> int:
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM products")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+def reindex_products_since(connection, last_id: int):
+    """Indexa na busca os produtos com id acima de `last_id` (ex.: os inseridos por uma carga)"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT id, name, description, category_id FROM products WHERE id > %s ORDER BY id",
+                       (last_id,))
+        for row in cursor.fetchall():
+            search_index.add(*row)
+    finally:
+        cursor.close()
+
+def reindex_products(connection, product_ids):
+    """Reindexa na busca os produtos informados, lendo-os do banco"""
+    cursor = connection.cursor()
+    try:
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        cursor.execute(f"SELECT id, name, description, category_id FROM products WHERE id IN ({placeholders})",
+                       list(product_ids))
+        for row in cursor.fetchall():
+            search_index.add(*row)
+    finally:
+        cursor.close()
+
+# Funções de autenticação
+USER_BY_USERNAME_QUERY = "SELECT * FROM users WHERE username = %s"
+
+def run_in_hash_pool(func, *args):
+    """Executa uma operação de bcrypt no pool dedicado, recusando com 503 se a fila estiver cheia"""
+    if not hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service busy, try again",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        future = hash_executor.submit(func, *args)
+    except Exception:
+        hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: hash_slots.release())
+    return future.result()
+
+def verify_password(plain_password, hashed_password):
+    return run_in_hash_pool(pwd_context.verify, plain_password, hashed_password)
+
+def get_password_hash(password):
+    return run_in_hash_pool(pwd_context.hash, password)
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(minutes=15)
+    to_encode.update({"exp": expire})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+def decode_token(token: str) -> dict:
+    """Payload do JWT, com cache por token; levanta JWTError se o token for inválido ou expirado"""
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.set(token, payload, ttl=payload.get("exp", 0) - time.time())
+    return payload
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Usuário do token; só empresta uma conexão quando ele não está no cache"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    try:
+        payload = decode_token(credentials.credentials)
+    except JWTError:
+        raise credentials_exception
+
+    username: str = payload.get("sub")
+    if username is None:
+        raise credentials_exception
+
+    cache_key = (username, payload.get("exp"))
+    cached_user = user_cache.get(cache_key)
+    if cached_user is not None:
+        return cached_user
+    
+    # Devolvida antes de o endpoint pegar a sua: nunca há duas conexões presas pela mesma requisição
+    with borrow_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute(USER_BY_USERNAME_QUERY, (username,))
+            user = cursor.fetchone()
+        finally:
+            cursor.close()
+    if user is None:
+        raise credentials_exception
+    current_user = User(**user)
+    user_cache.set(cache_key, current_user, ttl=payload.get("exp", 0) - time.time())
+    return current_user
+
+# Endpoints de autenticação
+@app.post("/auth/register", response_model=User, dependencies=[Depends(rate_limit_by_ip("register"))])
+def register_user(user: UserCreate):
+    """Registra um novo usuário"""
+    # O hash é calculado antes de emprestar a conexão: a espera na fila do bcrypt não segura o pool
+    password_hash = get_password_hash(user.password)
+    with borrow_connection() as connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            
+            # Verificar se usuário já existe
+            cursor.execute("SELECT id FROM users WHERE username = %s OR email = %s", 
+                          (user.username, user.email))
+            if cursor.fetchone():
+                raise HTTPException(status_code=400, detail="Username or email already registered")
+            
+            # Criar usuário
+            cursor.execute("""
+                INSERT INTO users (username, email, password_hash, full_name)
+                VALUES (%s, %s, %s, %s)
+            """, (user.username, user.email, password_hash, user.full_name))
+            
+            connection.commit()
+            user_id = cursor.lastrowid
+            
+            # Retornar dados do usuário (sem senha)
+            cursor.execute("SELECT id, username, email, full_name, is_active FROM users WHERE id = %s", (user_id,))
+            user_data = cursor.fetchone()
+            
+            return User(**user_data)
+            
+        except Error as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        finally:
+            cursor.close()
+
+@app.post("/auth/login", response_model=Token, dependencies=[Depends(rate_limit_by_ip("login"))])
+def login_user(user: UserLogin):
+    """Faz login do usuário"""
+    # A conexão volta ao pool antes do bcrypt, que pode esperar na fila do pool de hash
+    with borrow_connection() as connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("SELECT username, password_hash FROM users WHERE username = %s", (user.username,))
+            db_user = cursor.fetchone()
+        except Error as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        finally:
+            cursor.close()
+    
+    if not db_user or not verify_password(user.password, db_user['password_hash']):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": db_user['username']}, expires_delta=access_token_expires
+    )
+    
+    return {"access_token": access_token, "token_type": "bearer"}
+
+# Endpoints de categorias
+@app.post("/categories", response_model=Category)
+def create_category(category: CategoryCreate, current_user: User = Depends(get_current_user),
+                    connection: PooledConnection = Depends(get_db)):
+    """Cria uma nova categoria"""
+    try:
+        cursor = connection.cursor(dictionary=True)
         cursor.execute("""
             INSERT INTO categories (name, description)
             VALUES (%s, %s)
         """, (category.name, category.description))
+        category_id = cursor.lastrowid
+        cache_sync.publish(cursor, "categories")
         
         connection.commit()
-        category_id = cursor.lastrowid
+        mark_user_write(current_user.username, connection)
         
         cursor.execute("SELECT * FROM categories WHERE id = %s", (category_id,))
         category_data = cursor.fetchone()
+        invalidate_catalog_cache(categories=True)
         
         return Category(**category_data)
         
     except Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        cursor.close()
 
 @app.get("/categories", response_model=List[Category])
-async def get_categories():
+def get_categories(request: Request):
     """Lista todas as categorias"""
-    connection = get_db_connection()
-    if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    
-    try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM categories ORDER BY name")
-        categories = cursor.fetchall()
-        
-        return [Category(**cat) for cat in categories]
-        
-    except Error as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+    def load():
+        with borrow_connection(read_pool(catalog_key=("categories",))) as connection:
+            try:
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute("SELECT * FROM categories ORDER BY name")
+                return cursor.fetchall()
+                
+            except Error as e:
+                raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+            finally:
+                cursor.close()
+
+    return cached_json_response(request, catalog_cache, ("categories",), Category, load)
 
 # Endpoints de produtos
+PRODUCT_BY_ID_QUERY = "SELECT * FROM products WHERE id = %s"
+PRODUCT_INSERT = """
+    INSERT INTO products (name, description, price, stock, category_id, image_url)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+def _product_values(product: ProductCreate):
+    return (product.name, product.description, product.price, product.stock,
+            product.category_id, product.image_url)
+
 @app.post("/products", response_model=Product)
-async def create_product(product: ProductCreate, current_user: User = Depends(get_current_user)):
+def create_product(product: ProductCreate, current_user: User = Depends(get_current_user),
+                   connection: PooledConnection = Depends(get_db)):
     """Cria um novo produto"""
-    connection = get_db_connection()
-    if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    
     try:
-        cursor = connection.cursor()
-        cursor.execute("""
-            INSERT INTO products (name, description, price, stock, category_id, image_url)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (product.name, product.description, product.price, product.stock, 
-              product.category_id, product.image_url))
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(PRODUCT_INSERT, _product_values(product))
+        product_id = cursor.lastrowid
+        cache_sync.publish(cursor, "product", [product_id])
+        cache_sync.publish(cursor, "search", [product_id])
         
         connection.commit()
-        product_id = cursor.lastrowid
+        mark_user_write(current_user.username, connection)
         
         cursor.execute("SELECT * FROM products WHERE id = %s", (product_id,))
         product_data = cursor.fetchone()
+        invalidate_catalog_cache([product_id])
+        search_index.add(product_id, product_data['name'], product_data['description'],
+                         product_data['category_id'])
         
         return Product(**product_data)
         
     except Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        cursor.close()
+
+# Chaves de ordenação aceitas em GET /products: nome do parâmetro -> (coluna, descendente)
+PRODUCT_SORTS = {
+    "name": ("name", False),
+    "-name": ("name", True),
+    "price": ("price", False),
+    "-price": ("price", True),
+    "created_at": ("created_at", False),
+    "-created_at": ("created_at", True),
+}
+PRODUCT_PAGE_SIZE = int(os.getenv('PRODUCT_PAGE_SIZE', '50'))
+PRODUCT_PAGE_MAX = int(os.getenv('PRODUCT_PAGE_MAX', '200'))
+
+def encode_cursor(*values) -> str:
+    """Codifica a posição de uma página (valores da chave de ordenação) em um cursor opaco"""
+    raw = json.dumps([str(v) if isinstance(v, Decimal) else
+                      v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list):
+            raise ValueError
+        return values
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_condition(column: str, descending: bool) -> str:
+    """Condição "depois do cursor" para ORDER BY column, id; parâmetros em keyset_params.
+
+    Escrita com OR, e não como comparação de tuplas: assim o MySQL lê o índice como range.
+    """
+    op = "<" if descending else ">"
+    return f"({column} {op} %s OR ({column} = %s AND id {op} %s))"
+
+def keyset_params(after: str) -> list:
+    values = decode_cursor(after)
+    if len(values) != 2:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return [values[0], values[0], values[1]]
+
+def product_list_query(conditions: List[str], column: str, descending: bool) -> str:
+    """SELECT de uma página de GET /products (o último parâmetro é o LIMIT)"""
+    direction = "DESC" if descending else "ASC"
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"""
+        SELECT * FROM products {where}
+        ORDER BY {column} {direction}, id {direction}
+        LIMIT %s
+    """
 
 @app.get("/products", response_model=List[Product])
-async def get_products(category_id: Optional[int] = None):
-    """Lista produtos, opcionalmente filtrados por categoria"""
-    connection = get_db_connection()
-    if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    
+def get_products(category_id: Optional[int] = None,
+                 min_price: Optional[Decimal] = None,
+                 max_price: Optional[Decimal] = None,
+                 in_stock: bool = False,
+                 sort: str = "name",
+                 limit: int = Query(PRODUCT_PAGE_SIZE, ge=1, le=PRODUCT_PAGE_MAX),
+                 after: Optional[str] = None,
+                 connection: PooledConnection = Depends(get_read_db)):
+    """Lista produtos com filtros, ordenação e paginação por cursor (cabeçalho X-Next-Cursor)"""
+    if sort not in PRODUCT_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort, use one of: {', '.join(PRODUCT_SORTS)}")
+    column, descending = PRODUCT_SORTS[sort]
+
+    conditions = []
+    params = []
+    if category_id:
+        conditions.append("category_id = %s")
+        params.append(category_id)
+    if min_price is not None:
+        conditions.append("price >= %s")
+        params.append(min_price)
+    if max_price is not None:
+        conditions.append("price <= %s")
+        params.append(max_price)
+    if in_stock:
+        conditions.append("stock > 0")
+    if after:
+        conditions.append(keyset_condition(column, descending))
+        params.extend(keyset_params(after))
+
     try:
         cursor = connection.cursor(dictionary=True)
-        
-        if category_id:
-            cursor.execute("SELECT * FROM products WHERE category_id = %s ORDER BY name", (category_id,))
-        else:
-            cursor.execute("SELECT * FROM products ORDER BY name")
+        # Busca um item a mais para saber se existe próxima página
+        cursor.execute(product_list_query(conditions, column, descending), (*params, limit + 1))
         
         products = cursor.fetchall()
-        return [Product(**prod) for prod in products]
+        headers = {}
+        if len(products) > limit:
+            products = products[:limit]
+            last = products[-1]
+            headers["X-Next-Cursor"] = encode_cursor(last[column], last['id'])
+        return json_rows_response(Product, products, headers)
+        
+    except Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        cursor.close()
+
+class BulkImporter:
+    """Valida linhas uma a uma e grava em INSERTs de várias linhas, uma transação por lote.
+
+    Cada lote empresta a sua conexão: enquanto o corpo chega (um upload lento pode levar
+    minutos), nenhuma conexão do pool fica presa.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.pending = []  # (linha, ProductCreate)
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < BULK_IMPORT_MAX_ERRORS:
+            self.errors.append(BulkImportError(line=line, error=message))
+
+    def add(self, line: int, data):
+        """Valida uma linha; devolve True quando o lote está cheio e deve ser gravado"""
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("Expected a JSON object")
+            # Campos opcionais vazios no CSV valem como ausentes
+            data = {key: value for key, value in data.items() if value != ""}
+            self.pending.append((line, ProductCreate(**data)))
+        except ValidationError as e:
+            self.error(line, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+        except (ValueError, TypeError) as e:
+            self.error(line, str(e))
+        return len(self.pending) >= self.batch_size
+
+    def flush(self):
+        """Grava o lote pendente; se o INSERT em lote falhar, regrava linha a linha para isolar os erros"""
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        with borrow_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                try:
+                    cursor.executemany(PRODUCT_INSERT, [_product_values(product) for _, product in batch])
+                    connection.commit()
+                    self.inserted += len(batch)
+                    return
+                except Error:
+                    connection.rollback()
+                for line, product in batch:
+                    try:
+                        cursor.execute(PRODUCT_INSERT, _product_values(product))
+                        connection.commit()
+                        self.inserted += 1
+                    except Error as e:
+                        connection.rollback()
+                        self.error(line, e.msg)
+            finally:
+                cursor.close()
+
+async def iter_import_records(request: Request):
+    """Lê o corpo em streaming e produz (número da linha, registro) de NDJSON ou CSV"""
+    is_csv = "csv" in request.headers.get("content-type", "")
+    header = None
+    record, record_line = "", 0
+    buffer = b""
+    line_number = 0
+
+    async def lines():
+        nonlocal buffer
+        async for chunk in request.stream():
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\n")
+            for raw in complete:
+                yield raw
+        if buffer:
+            yield buffer
+
+    async for raw in lines():
+        line_number += 1
+        text = raw.decode("utf-8-sig" if line_number == 1 else "utf-8", errors="replace").rstrip("\r")
+        if not is_csv:
+            if not text.strip():
+                continue
+            try:
+                yield line_number, json.loads(text)
+            except ValueError as e:
+                yield line_number, e
+            continue
+
+        # CSV: campos entre aspas podem conter quebras de linha; junta até fechar as aspas
+        if not record:
+            record_line = line_number
+            record = text
+        else:
+            record += "\n" + text
+        if record.count('"') % 2:
+            continue
+        values, record = next(csv.reader([record]), []), ""
+        if not values:
+            continue
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        if len(values) != len(header):
+            yield record_line, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield record_line, dict(zip(header, values))
+
+def publish_search_since(connection, last_id: int):
+    """Avisa os outros processos para indexarem os produtos inseridos por uma carga"""
+    if not CACHE_SYNC:
+        return
+    cursor = connection.cursor()
+    try:
+        cache_sync.publish(cursor, "search_since", [last_id])
+        connection.commit()
+    except Error as e:
+        print(f"Erro ao publicar indexação da carga: {e}")
+    finally:
+        cursor.close()
+
+def with_connection(func, *args):
+    """Roda func(connection, *args) com uma conexão emprestada só durante a chamada"""
+    with borrow_connection() as connection:
+        return func(connection, *args)
+
+def finish_bulk_import(connection, username: str, last_id: int):
+    mark_user_write(username, connection)
+    reindex_products_since(connection, last_id)
+    publish_search_since(connection, last_id)
+
+@app.post("/products/bulk", response_model=BulkImportResult)
+async def bulk_import_products(request: Request,
+                               batch_size: int = Query(BULK_IMPORT_BATCH_SIZE, ge=1, le=5000),
+                               current_user: User = Depends(get_current_user)):
+    """Importa produtos de um corpo NDJSON (padrão) ou CSV (Content-Type: text/csv) em lotes"""
+    importer = BulkImporter(batch_size)
+    last_id = await run_in_threadpool(with_connection, max_product_id)
+    async for line, data in iter_import_records(request):
+        if isinstance(data, Exception):
+            importer.error(line, str(data))
+            continue
+        if importer.add(line, data):
+            await run_in_threadpool(importer.flush)
+    await run_in_threadpool(importer.flush)
+
+    # Ao final da carga, só os produtos novos (id acima do maior de antes) entram no índice de
+    # busca; o cache do catálogo só guarda produtos já existentes e categorias, que a carga não altera
+    if importer.inserted:
+        await run_in_threadpool(with_connection, finish_bulk_import, current_user.username, last_id)
+    return BulkImportResult(inserted=importer.inserted, failed=importer.failed, errors=importer.errors)
+
+@app.get("/products/search", response_model=List[Product])
+def search_products(q: str = Query(..., min_length=1),
+                    category_id: Optional[int] = None,
+                    limit: int = Query(20, ge=1, le=PRODUCT_PAGE_MAX),
+                    connection: PooledConnection = Depends(get_read_db)):
+    """Busca produtos por nome e descrição usando o índice em memória"""
+    product_ids = search_index.search(q, limit=limit, category_id=category_id)
+    if not product_ids:
+        return []
+    try:
+        cursor = connection.cursor(dictionary=True)
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        cursor.execute(f"SELECT * FROM products WHERE id IN ({placeholders})", product_ids)
+        rows = {row['id']: row for row in cursor.fetchall()}
+        return json_rows_response(Product, [rows[pid] for pid in product_ids if pid in rows])
         
     except Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        if connection.is_connected():
+        cursor.close()
+
+@app.get("/products/{product_id}", response_model=Product)
+def get_product(product_id: int, request: Request):
+    """Obtém um produto específico"""
+    def load():
+        with borrow_connection(read_pool(catalog_key=("product", product_id))) as connection:
+            try:
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute(PRODUCT_BY_ID_QUERY, (product_id,))
+                product = cursor.fetchone()
+                
+                if not product:
+                    raise HTTPException(status_code=404, detail="Product not found")
+                
+                return product
+                
+            except Error as e:
+                raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+            finally:
+                cursor.close()
+
+    return cached_json_response(request, catalog_cache, ("product", product_id), Product, load)
+
+# Estoque: reservas feitas ao adicionar ao carrinho e contadores divididos para produtos quentes.
+# products.stock é o estoque disponível (já descontadas as reservas). Um produto quente
+# (stock_slots > 0) guarda o estoque em inventory_slots, dividido em slots: cada baixa trava só
+# um slot sorteado, e não a linha do produto. Nesse caso products.stock é o total reconciliado
+# periodicamente a partir dos slots, que também são rebalanceados.
+STOCK_RESERVATION_SECONDS = int(os.getenv('STOCK_RESERVATION_SECONDS', '900'))
+INVENTORY_SWEEP_INTERVAL = float(os.getenv('INVENTORY_SWEEP_INTERVAL', '5'))
+INVENTORY_SWEEP_BATCH = int(os.getenv('INVENTORY_SWEEP_BATCH', '500'))
+
+def stock_error(status_code: int, product_ids) -> HTTPException:
+    """404 (produto inexistente) ou 400 (sem estoque), no formato de um produto ou de vários"""
+    product_ids = list(product_ids)
+    if status_code == 404:
+        single, plural = "Product not found", "Products not found"
+    else:
+        single, plural = "Insufficient stock", "Insufficient stock for products"
+    if len(product_ids) == 1:
+        return HTTPException(status_code=status_code, detail=single)
+    return HTTPException(status_code=status_code, detail=f"{plural}: {', '.join(map(str, product_ids))}")
+
+def take_stock(cursor, product_id: int, quantity: int, slots: int) -> bool:
+    """Baixa `quantity` do estoque do produto na transação corrente; False se não houver o bastante"""
+    if not slots:
+        cursor.execute("""
+            UPDATE products SET stock = stock - %s
+            WHERE id = %s AND stock >= %s AND stock_slots = 0
+        """, (quantity, product_id, quantity))
+        return cursor.rowcount == 1
+    
+    # Leitura sem lock para escolher um slot que cubra a quantidade; o UPDATE condicional confirma
+    cursor.execute("SELECT slot, stock FROM inventory_slots WHERE product_id = %s", (product_id,))
+    candidates = [slot for slot, stock in cursor.fetchall() if stock >= quantity]
+    if candidates:
+        cursor.execute("""
+            UPDATE inventory_slots SET stock = stock - %s
+            WHERE product_id = %s AND slot = %s AND stock >= %s
+        """, (quantity, product_id, random.choice(candidates), quantity))
+        if cursor.rowcount == 1:
+            return True
+    
+    # Nenhum slot sozinho basta (ou outro checkout esvaziou o escolhido): junta de vários,
+    # travando todos em ordem. É o caminho raro, perto do fim do estoque.
+    cursor.execute("""
+        SELECT slot, stock FROM inventory_slots WHERE product_id = %s ORDER BY slot FOR UPDATE
+    """, (product_id,))
+    rows = cursor.fetchall()
+    if sum(stock for _, stock in rows) < quantity:
+        return False
+    remaining = quantity
+    updates = []
+    for slot, stock in rows:
+        taken = min(stock, remaining)
+        if taken:
+            updates.append((taken, product_id, slot))
+            remaining -= taken
+        if remaining == 0:
+            break
+    cursor.executemany("UPDATE inventory_slots SET stock = stock - %s WHERE product_id = %s AND slot = %s",
+                       updates)
+    return True
+
+def put_stock(cursor, product_id: int, quantity: int, slots: int):
+    """Devolve `quantity` ao estoque do produto (reserva liberada ou vencida)"""
+    if slots:
+        cursor.execute("UPDATE inventory_slots SET stock = stock + %s WHERE product_id = %s AND slot = %s",
+                       (quantity, product_id, random.randrange(slots)))
+        if cursor.rowcount == 1:
+            return
+    cursor.execute("UPDATE products SET stock = stock + %s WHERE id = %s", (quantity, product_id))
+
+def product_slots(cursor, product_ids) -> dict:
+    """Número de slots de cada produto existente (0 = estoque na própria linha do produto)"""
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(f"SELECT id, stock_slots FROM products WHERE id IN ({placeholders})", list(product_ids))
+    return dict(cursor.fetchall())
+
+def reserve_stock(cursor, user_id: int, quantities: dict, absolute: bool = False) -> List[int]:
+    """Reserva estoque para o carrinho do usuário, na transação corrente (sem commit).
+
+    Com absolute=False soma `quantities` às reservas atuais (adicionar ao carrinho); com True
+    define a reserva de cada produto (0 libera). Toda reserva tocada volta a valer por
+    STOCK_RESERVATION_SECONDS. 404 para produtos inexistentes e 400 sem estoque. Publica e
+    devolve os ids dos produtos cujo estoque mudou: o chamador invalida o cache após o commit.
+    """
+    slots = product_slots(cursor, quantities)
+    missing = [product_id for product_id in quantities if product_id not in slots]
+    if missing:
+        raise stock_error(404, missing)
+    
+    # Reservas antes do estoque: a mesma ordem de locks do checkout e da limpeza de vencidas.
+    # A linha da reserva é criada (vazia) antes do FOR UPDATE: em REPEATABLE READ, travar uma
+    # chave inexistente pega um gap lock, e dois usuários sem reserva no mesmo intervalo
+    # bloqueariam o INSERT um do outro (deadlock). Com a linha criada, o lock é só do registro.
+    product_ids = sorted(quantities)
+    cursor.executemany("""
+        INSERT INTO stock_reservations (user_id, product_id, quantity, expires_at)
+        VALUES (%s, %s, 0, NOW())
+        ON DUPLICATE KEY UPDATE quantity = quantity
+    """, [(user_id, product_id) for product_id in product_ids])
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(f"""
+        SELECT product_id, quantity FROM stock_reservations
+        WHERE user_id = %s AND product_id IN ({placeholders})
+        ORDER BY product_id
+        FOR UPDATE
+    """, (user_id, *product_ids))
+    current = dict(cursor.fetchall())
+    
+    short = []
+    updates = []
+    released = []
+    changed = []
+    for product_id in product_ids:
+        held = current.get(product_id, 0)
+        target = quantities[product_id] if absolute else held + quantities[product_id]
+        if target > held and not take_stock(cursor, product_id, target - held, slots[product_id]):
+            short.append(product_id)
+            continue
+        if target < held:
+            put_stock(cursor, product_id, held - target, slots[product_id])
+        if target != held:
+            changed.append(product_id)
+        if target:
+            updates.append((target, STOCK_RESERVATION_SECONDS, user_id, product_id))
+        else:
+            released.append(product_id)
+    if short:
+        raise stock_error(400, short)
+    
+    if updates:
+        cursor.executemany("""
+            UPDATE stock_reservations SET quantity = %s, expires_at = NOW() + INTERVAL %s SECOND
+            WHERE user_id = %s AND product_id = %s
+        """, updates)
+    if released:
+        placeholders = ", ".join(["%s"] * len(released))
+        cursor.execute(f"DELETE FROM stock_reservations WHERE user_id = %s AND product_id IN ({placeholders})",
+                       (user_id, *released))
+    if changed:
+        cache_sync.publish(cursor, "product", changed)
+    return changed
+
+def release_stock(cursor, user_id: int, product_id: int) -> List[int]:
+    """Libera a reserva de um produto removido do carrinho (sem commit)"""
+    return reserve_stock(cursor, user_id, {product_id: 0}, absolute=True)
+
+def consume_reservations(cursor, user_id: int, items, slots: dict):
+    """Converte as reservas do usuário em baixa definitiva para os itens (product_id, quantity).
+
+    A parte reservada já saiu do estoque; reservas acima do comprado voltam ao estoque. Baixa
+    o que faltar (reserva vencida ou menor que o carrinho) dos produtos quentes. Devolve os
+    ids dos demais com a quantidade ainda a baixar, para o UPDATE em lote do checkout, e os
+    ids dos produtos que receberam estoque de volta.
+    """
+    cursor.execute("""
+        SELECT product_id, quantity FROM stock_reservations
+        WHERE user_id = %s
+        ORDER BY product_id
+        FOR UPDATE
+    """, (user_id,))
+    reserved = dict(cursor.fetchall())
+    if reserved:
+        cursor.execute("DELETE FROM stock_reservations WHERE user_id = %s", (user_id,))
+    
+    ordered = dict(items)
+    excess = {product_id: held - ordered.get(product_id, 0) for product_id, held in reserved.items()
+              if held > ordered.get(product_id, 0)}
+    if excess:
+        # Reservas de produtos fora do pedido: o número de slots não veio com os itens
+        unknown = [product_id for product_id in excess if product_id not in slots]
+        excess_slots = {**slots, **(product_slots(cursor, unknown) if unknown else {})}
+        for product_id in sorted(excess):
+            put_stock(cursor, product_id, excess[product_id], excess_slots.get(product_id, 0))
+    
+    pending = {}
+    short = []
+    for product_id, quantity in items:
+        need = quantity - reserved.get(product_id, 0)
+        if need <= 0:
+            continue
+        if slots[product_id]:
+            if not take_stock(cursor, product_id, need, slots[product_id]):
+                short.append(product_id)
+        else:
+            pending[product_id] = need
+    if short:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Insufficient stock for products: {', '.join(map(str, short))}",
+        )
+    return pending, sorted(excess)
+
+def release_expired_reservations(connection) -> int:
+    """Devolve ao estoque as reservas vencidas; devolve quantas foram liberadas"""
+    cursor = connection.cursor()
+    try:
+        # Sem JOIN com products: o FOR UPDATE travaria também a linha dos produtos quentes
+        cursor.execute("""
+            SELECT user_id, product_id, quantity FROM stock_reservations
+            WHERE expires_at <= NOW()
+            ORDER BY user_id, product_id
+            LIMIT %s
+            FOR UPDATE
+        """, (INVENTORY_SWEEP_BATCH,))
+        expired = cursor.fetchall()
+        if not expired:
+            connection.commit()
+            return 0
+        returned = {}
+        for _, product_id, quantity in expired:
+            returned[product_id] = returned.get(product_id, 0) + quantity
+        slots = product_slots(cursor, returned)
+        for product_id in sorted(returned):
+            put_stock(cursor, product_id, returned[product_id], slots.get(product_id, 0))
+        cursor.executemany("DELETE FROM stock_reservations WHERE user_id = %s AND product_id = %s",
+                           [(user_id, product_id) for user_id, product_id, _ in expired])
+        cache_sync.publish(cursor, "product", sorted(returned))
+        connection.commit()
+        invalidate_catalog_cache(sorted(returned))
+        return len(expired)
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def reconcile_hot_stock(connection):
+    """Recalcula products.stock dos produtos quentes a partir dos slots e rebalanceia os slots"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT id FROM products WHERE stock_slots > 0")
+        changed = []
+        for (product_id,) in cursor.fetchall():
+            cursor.execute("""
+                SELECT slot, stock FROM inventory_slots WHERE product_id = %s ORDER BY slot FOR UPDATE
+            """, (product_id,))
+            rows = cursor.fetchall()
+            total = sum(stock for _, stock in rows)
+            share, extra = divmod(total, len(rows)) if rows else (0, 0)
+            cursor.executemany("UPDATE inventory_slots SET stock = %s WHERE product_id = %s AND slot = %s",
+                               [(share + (1 if i < extra else 0), product_id, slot)
+                                for i, (slot, _) in enumerate(rows)])
+            cursor.execute("UPDATE products SET stock = %s WHERE id = %s AND stock <> %s",
+                           (total, product_id, total))
+            if cursor.rowcount:
+                changed.append(product_id)
+                cache_sync.publish(cursor, "product", [product_id])
+            connection.commit()
+        invalidate_catalog_cache(changed)
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def maintain_inventory(connection):
+    """Libera todas as reservas vencidas (em lotes) e reconcilia os produtos quentes"""
+    while release_expired_reservations(connection) >= INVENTORY_SWEEP_BATCH:
+        pass
+    reconcile_hot_stock(connection)
+
+def set_hot_product(connection, product_id: int, slots: int) -> Optional[int]:
+    """Divide o estoque do produto em `slots` contadores (0 volta para a linha do produto).
+
+    Devolve o estoque total, ou None se o produto não existir.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT stock, stock_slots FROM products WHERE id = %s FOR UPDATE", (product_id,))
+        row = cursor.fetchone()
+        if row is None:
+            connection.rollback()
+            return None
+        total, current = row
+        if current:
+            cursor.execute("""
+                SELECT COALESCE(SUM(stock), 0) FROM inventory_slots WHERE product_id = %s FOR UPDATE
+            """, (product_id,))
+            total = int(cursor.fetchone()[0])
+            cursor.execute("DELETE FROM inventory_slots WHERE product_id = %s", (product_id,))
+        if slots:
+            share, extra = divmod(total, slots)
+            cursor.executemany("INSERT INTO inventory_slots (product_id, slot, stock) VALUES (%s, %s, %s)",
+                               [(product_id, slot, share + (1 if slot < extra else 0)) for slot in range(slots)])
+        cursor.execute("UPDATE products SET stock = %s, stock_slots = %s WHERE id = %s",
+                       (total, slots, product_id))
+        cache_sync.publish(cursor, "product", [product_id])
+        connection.commit()
+        invalidate_catalog_cache([product_id])
+        return total
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+# Endpoints do carrinho
+CART_ITEM_QUERY = """
+    SELECT ci.id, ci.user_id, ci.product_id, ci.quantity,
+           p.name as product_name, p.price as product_price,
+           (ci.quantity * p.price) as total_price
+    FROM cart_items ci
+    JOIN products p ON ci.product_id = p.id
+"""
+
+CART_QUERY = CART_ITEM_QUERY + """
+    WHERE ci.user_id = %s
+    ORDER BY ci.created_at DESC
+"""
+
+def fetch_cart(cursor, user_id: int) -> List[dict]:
+    """Linhas do carrinho do usuário, do mais recente ao mais antigo (cursor em modo dicionário)"""
+    cursor.execute(CART_QUERY, (user_id,))
+    return cursor.fetchall()
+
+# Armazenamento do carrinho (CART_BACKEND): "mysql" grava direto em cart_items; "memory" mantém os
+# carrinhos em memória, em shards com lock próprio, e grava em cart_items em lotes (write-behind)
+CART_BACKEND = os.getenv('CART_BACKEND', 'mysql').lower()
+CART_SHARDS = int(os.getenv('CART_SHARDS', '64'))
+CART_MAX_USERS = int(os.getenv('CART_MAX_USERS', '100000'))
+CART_FLUSH_INTERVAL = float(os.getenv('CART_FLUSH_INTERVAL', '1'))
+CART_FLUSH_BATCH = int(os.getenv('CART_FLUSH_BATCH', '500'))
+
+class MySQLCartStore:
+    """Carrinho direto na tabela cart_items; cada operação faz commit na conexão da requisição"""
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def items(self, connection, user_id: int) -> List[dict]:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            return fetch_cart(cursor, user_id)
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _reserve(connection, user_id: int, quantities: dict, absolute: bool = False) -> List[int]:
+        # reserve_stock lê tuplas: usa um cursor simples na mesma transação
+        cursor = connection.cursor()
+        try:
+            return reserve_stock(cursor, user_id, quantities, absolute)
+        finally:
+            cursor.close()
+
+    def add(self, connection, user_id: int, product_id: int, quantity: int) -> dict:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            # A reserva confere existência e estoque; o item só é gravado se ela passar
+            changed = self._reserve(connection, user_id, {product_id: quantity})
+            cursor.execute("""
+                INSERT INTO cart_items (user_id, product_id, quantity)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE quantity = cart_items.quantity + VALUES(quantity)
+            """, (user_id, product_id, quantity))
+            
+            connection.commit()
+            invalidate_catalog_cache(changed)
+            
+            # Retornar dados completos do item
+            cursor.execute(CART_ITEM_QUERY + """
+                WHERE ci.user_id = %s AND ci.product_id = %s
+            """, (user_id, product_id))
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def set_items(self, connection, user_id: int, quantities: dict) -> List[dict]:
+        to_set = {product_id: qty for product_id, qty in quantities.items() if qty > 0}
+        to_remove = [product_id for product_id, qty in quantities.items() if qty == 0]
+        cursor = connection.cursor(dictionary=True)
+        try:
+            changed = self._reserve(connection, user_id, quantities, absolute=True)
+            if to_set:
+                cursor.executemany("""
+                    INSERT INTO cart_items (user_id, product_id, quantity)
+                    VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+                """, [(user_id, product_id, qty) for product_id, qty in to_set.items()])
+            
+            if to_remove:
+                placeholders = ", ".join(["%s"] * len(to_remove))
+                cursor.execute(f"""
+                    DELETE FROM cart_items WHERE user_id = %s AND product_id IN ({placeholders})
+                """, (user_id, *to_remove))
+            
+            connection.commit()
+            invalidate_catalog_cache(changed)
+            return fetch_cart(cursor, user_id)
+        except Error:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def remove(self, connection, user_id: int, item_id: int) -> bool:
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT product_id FROM cart_items WHERE id = %s AND user_id = %s FOR UPDATE",
+                           (item_id, user_id))
+            row = cursor.fetchone()
+            if row is None:
+                return False
+            changed = release_stock(cursor, user_id, row[0])
+            cursor.execute("""
+                DELETE FROM cart_items WHERE id = %s AND user_id = %s
+            """, (item_id, user_id))
+            connection.commit()
+            invalidate_catalog_cache(changed)
+            return True
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def checkout(self, connection, cursor, user_id: int):
+        # O checkout lê e limpa cart_items na própria transação
+        yield
+
+    def stats(self) -> dict:
+        return {'backend': 'mysql'}
+
+class _CartShard:
+    __slots__ = ('lock', 'carts', 'dirty', 'flushing')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.carts = OrderedDict()  # user_id -> _Cart, em ordem de uso (LRU)
+        self.dirty = set()          # usuários com alterações ainda não gravadas
+        self.flushing = set()       # usuários sendo gravados agora
+
+class _Cart:
+    __slots__ = ('items', 'checking_out')
+
+    def __init__(self, rows):
+        self.items = {product_id: [quantity, created_at] for product_id, quantity, created_at in rows}
+        self.checking_out = False
+
+class MemoryCartStore:
+    """Carrinhos em memória, divididos em shards por usuário, com gravação em lote em cart_items.
+
+    A memória é a fonte da verdade; cart_items é a cópia durável, usada para carregar o carrinho
+    de um usuário na primeira vez que ele é acessado (inclusive após um restart). Uma queda perde
+    no máximo as alterações do último CART_FLUSH_INTERVAL. O id de um item é o id do produto.
+    Os carrinhos ficam no processo: use com um único worker da API.
+    """
+
+    def __init__(self, shards: int = CART_SHARDS, max_users: int = CART_MAX_USERS,
+                 flush_interval: float = CART_FLUSH_INTERVAL, flush_batch: int = CART_FLUSH_BATCH):
+        self._shards = [_CartShard() for _ in range(shards)]
+        self.max_users_per_shard = max(1, max_users // shards)
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.flush_errors = 0
+
+    # Ciclo de vida
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="cart-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    # Acesso aos carrinhos
+    def _load(self, connection, user_id: int):
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT product_id, quantity, created_at FROM cart_items WHERE user_id = %s",
+                           (user_id,))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def _locked(self, connection, user_id: int):
+        """Carrinho do usuário com o lock do shard adquirido (carregando do banco, sem lock, se preciso)"""
+        shard = self._shards[user_id % len(self._shards)]
+        rows = None
+        while True:
+            with shard.lock:
+                cart = shard.carts.get(user_id)
+                if cart is not None or rows is not None:
+                    if cart is None:
+                        cart = shard.carts[user_id] = _Cart(rows)
+                        self._evict(shard)
+                    shard.carts.move_to_end(user_id)
+                    yield shard, cart
+                    return
+            rows = self._load(connection, user_id)
+
+    def _evict(self, shard: _CartShard):
+        # Só carrinhos já gravados podem sair da memória; os demais esperam o próximo flush
+        excess = len(shard.carts) - self.max_users_per_shard
+        if excess <= 0:
+            return
+        for user_id in list(shard.carts):
+            cart = shard.carts[user_id]
+            if user_id in shard.dirty or user_id in shard.flushing or cart.checking_out:
+                continue
+            del shard.carts[user_id]
+            excess -= 1
+            if excess == 0:
+                break
+
+    def _products(self, connection, product_ids) -> dict:
+        """Nome e preço dos produtos, do cache ou (na falta) do banco"""
+        info = {}
+        missing = []
+        for product_id in product_ids:
+            entry = cart_product_cache.get(product_id)
+            if entry is None:
+                missing.append(product_id)
+            else:
+                info[product_id] = entry
+        if missing:
+            since = cart_product_cache.version()
+            cursor = connection.cursor(dictionary=True)
+            try:
+                placeholders = ", ".join(["%s"] * len(missing))
+                cursor.execute(f"SELECT id, name, price FROM products WHERE id IN ({placeholders})",
+                               missing)
+                for row in cursor.fetchall():
+                    info[row['id']] = row
+                    cart_product_cache.set(row['id'], row, since=since)
+            finally:
+                cursor.close()
+        return info
+
+    def _rows(self, connection, user_id: int, items) -> List[dict]:
+        info = self._products(connection, [product_id for product_id, _, _ in items])
+        rows = []
+        for product_id, quantity, _ in sorted(items, key=lambda item: item[2], reverse=True):
+            product = info.get(product_id)
+            if product is None:
+                continue
+            rows.append({
+                'id': product_id,
+                'user_id': user_id,
+                'product_id': product_id,
+                'quantity': quantity,
+                'product_name': product['name'],
+                'product_price': product['price'],
+                'total_price': quantity * product['price'],
+            })
+        return rows
+
+    def items(self, connection, user_id: int) -> List[dict]:
+        with self._locked(connection, user_id) as (_, cart):
+            items = [(product_id, quantity, created_at)
+                     for product_id, (quantity, created_at) in cart.items.items()]
+        return self._rows(connection, user_id, items)
+
+    def _reserve(self, connection, user_id: int, quantities: dict, absolute: bool = False):
+        # A reserva de estoque é a única escrita síncrona no banco; o carrinho em si vai no flush
+        cursor = connection.cursor()
+        try:
+            changed = reserve_stock(cursor, user_id, quantities, absolute)
+            connection.commit()
+            invalidate_catalog_cache(changed)
+        except (Error, HTTPException):
+            connection.rollback()
+            raise
+        finally:
             cursor.close()
-            connection.close()
 
-@app.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: int):
-    """Obtém um produto específico"""
-    connection = get_db_connection()
-    if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    
+    def add(self, connection, user_id: int, product_id: int, quantity: int) -> dict:
+        self._reserve(connection, user_id, {product_id: quantity})
+        with self._locked(connection, user_id) as (shard, cart):
+            entry = cart.items.get(product_id)
+            if entry is None:
+                entry = cart.items[product_id] = [0, datetime.now()]
+            entry[0] += quantity
+            shard.dirty.add(user_id)
+            item = (product_id, entry[0], entry[1])
+        return self._rows(connection, user_id, [item])[0]
+
+    def set_items(self, connection, user_id: int, quantities: dict) -> List[dict]:
+        self._reserve(connection, user_id, quantities, absolute=True)
+        now = datetime.now()
+        with self._locked(connection, user_id) as (shard, cart):
+            for product_id, qty in quantities.items():
+                if qty == 0:
+                    cart.items.pop(product_id, None)
+                elif product_id in cart.items:
+                    cart.items[product_id][0] = qty
+                else:
+                    cart.items[product_id] = [qty, now]
+            shard.dirty.add(user_id)
+        return self.items(connection, user_id)
+
+    def remove(self, connection, user_id: int, item_id: int) -> bool:
+        with self._locked(connection, user_id) as (_, cart):
+            if item_id not in cart.items:
+                return False
+        self._reserve(connection, user_id, {item_id: 0}, absolute=True)
+        with self._locked(connection, user_id) as (shard, cart):
+            cart.items.pop(item_id, None)
+            shard.dirty.add(user_id)
+        return True
+
+    @contextmanager
+    def checkout(self, connection, cursor, user_id: int):
+        """Grava o carrinho atual em cart_items na transação do checkout, que o lê e limpa.
+
+        Se a transação for confirmada, os itens comprados saem da memória; itens adicionados
+        durante o checkout continuam no carrinho. Dois checkouts simultâneos do mesmo usuário
+        não são permitidos: o segundo compraria o mesmo carrinho de novo.
+        """
+        with self._locked(connection, user_id) as (_, cart):
+            if cart.checking_out:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Checkout already in progress")
+            cart.checking_out = True
+            snapshot = {product_id: (quantity, created_at)
+                        for product_id, (quantity, created_at) in cart.items.items()}
+        shard = self._shards[user_id % len(self._shards)]
+        try:
+            cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (user_id,))
+            if snapshot:
+                cursor.executemany("""
+                    INSERT INTO cart_items (user_id, product_id, quantity, created_at)
+                    VALUES (%s, %s, %s, %s)
+                """, [(user_id, product_id, quantity, created_at)
+                      for product_id, (quantity, created_at) in snapshot.items()])
+            yield
+            with shard.lock:
+                for product_id, (quantity, _) in snapshot.items():
+                    entry = cart.items.get(product_id)
+                    if entry is None:
+                        continue
+                    entry[0] -= quantity
+                    if entry[0] <= 0:
+                        del cart.items[product_id]
+                # cart_items foi esvaziado pelo checkout; o flush regrava o que sobrou e
+                # corrige uma eventual gravação antiga que tenha terminado depois do commit
+                shard.dirty.add(user_id)
+        finally:
+            with shard.lock:
+                cart.checking_out = False
+
+    # Write-behind
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Grava em cart_items os carrinhos alterados desde o último flush"""
+        pending = []
+        for shard in self._shards:
+            with shard.lock:
+                for user_id in list(shard.dirty):
+                    cart = shard.carts.get(user_id)
+                    if cart is None or cart.checking_out:
+                        continue
+                    shard.dirty.discard(user_id)
+                    shard.flushing.add(user_id)
+                    pending.append((shard, user_id, [(product_id, quantity, created_at)
+                                                     for product_id, (quantity, created_at)
+                                                     in cart.items.items()]))
+        for start in range(0, len(pending), self.flush_batch):
+            self._write(pending[start:start + self.flush_batch])
+
+    def _write(self, batch):
+        ok = False
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            try:
+                user_ids = [user_id for _, user_id, _ in batch]
+                placeholders = ", ".join(["%s"] * len(user_ids))
+                cursor.execute(f"DELETE FROM cart_items WHERE user_id IN ({placeholders})", user_ids)
+                rows = [(user_id, product_id, quantity, created_at)
+                        for _, user_id, items in batch for product_id, quantity, created_at in items]
+                if rows:
+                    cursor.executemany("""
+                        INSERT INTO cart_items (user_id, product_id, quantity, created_at)
+                        VALUES (%s, %s, %s, %s)
+                    """, rows)
+                connection.commit()
+                ok = True
+            except Error as e:
+                connection.rollback()
+                print(f"Erro ao gravar carrinhos: {e}")
+            finally:
+                cursor.close()
+                connection.close()
+        for shard, user_id, _ in batch:
+            with shard.lock:
+                shard.flushing.discard(user_id)
+                if not ok:
+                    shard.dirty.add(user_id)
+        if ok:
+            self.flushes += 1
+        else:
+            self.flush_errors += 1
+
+    def stats(self) -> dict:
+        users = dirty = 0
+        for shard in self._shards:
+            with shard.lock:
+                users += len(shard.carts)
+                dirty += len(shard.dirty) + len(shard.flushing)
+        return {'backend': 'memory', 'users': users, 'dirty': dirty,
+                'flushes': self.flushes, 'flush_errors': self.flush_errors}
+
+if CART_BACKEND == 'memory' and API_WORKERS > 1:
+    raise RuntimeError("CART_BACKEND=memory exige um único processo da API (WEB_CONCURRENCY=1)")
+cart_store = MemoryCartStore() if CART_BACKEND == 'memory' else MySQLCartStore()
+
+@app.post("/cart/add", response_model=CartItem)
+def add_to_cart(item: CartItemCreate, current_user: User = Depends(get_current_user),
+                connection: PooledConnection = Depends(get_db)):
+    """Adiciona item ao carrinho"""
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM products WHERE id = %s", (product_id,))
-        product = cursor.fetchone()
-        
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        return Product(**product)
+        cart_item_data = cart_store.add(connection, current_user.id, item.product_id, item.quantity)
+        mark_user_write(current_user.username, connection)
+        return CartItem(**cart_item_data)
         
     except Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
 
-# Endpoints do carrinho
-@app.post("/cart/add", response_model=CartItem)
-async def add_to_cart(item: CartItemCreate, current_user: User = Depends(get_current_user)):
-    """Adiciona item ao carrinho"""
-    connection = get_db_connection()
-    if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    
+@app.post("/cart/batch", response_model=List[CartItem])
+def set_cart_items(batch: CartBatch, current_user: User = Depends(get_current_user),
+                   connection: PooledConnection = Depends(get_db)):
+    """Define a quantidade de vários produtos do carrinho em uma única transação"""
+    # Se o mesmo produto vier repetido, vale a última quantidade
+    quantities = {entry.product_id: entry.quantity for entry in batch.items}
     try:
-        cursor = connection.cursor()
-        
-        # Verificar se produto existe e tem estoque
-        cursor.execute("SELECT stock FROM products WHERE id = %s", (item.product_id,))
-        product = cursor.fetchone()
-        
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        if product[0] < item.quantity:
-            raise HTTPException(status_code=400, detail="Insufficient stock")
-        
-        # Verificar se item já está no carrinho
-        cursor.execute("""
-            SELECT id, quantity FROM cart_items 
-            WHERE user_id = %s AND product_id = %s
-        """, (current_user.id, item.product_id))
-        
-        existing_item = cursor.fetchone()
-        
-        if existing_item:
-            # Atualizar quantidade
-            new_quantity = existing_item[1] + item.quantity
-            cursor.execute("""
-                UPDATE cart_items SET quantity = %s WHERE id = %s
-            """, (new_quantity, existing_item[0]))
-            cart_item_id = existing_item[0]
-        else:
-            # Adicionar novo item
-            cursor.execute("""
-                INSERT INTO cart_items (user_id, product_id, quantity)
-                VALUES (%s, %s, %s)
-            """, (current_user.id, item.product_id, item.quantity))
-            cart_item_id = cursor.lastrowid
-        
-        connection.commit()
-        
-        # Retornar dados completos do item
-        cursor.execute("""
-            SELECT ci.id, ci.user_id, ci.product_id, ci.quantity,
-                   p.name as product_name, p.price as product_price,
-                   (ci.quantity * p.price) as total_price
-            FROM cart_items ci
-            JOIN products p ON ci.product_id = p.id
-            WHERE ci.id = %s
-        """, (cart_item_id,))
-        
-        cart_item_data = cursor.fetchone()
-        return CartItem(**cart_item_data)
+        rows = cart_store.set_items(connection, current_user.id, quantities)
+        mark_user_write(current_user.username, connection)
+        return json_rows_response(CartItem, rows)
         
     except Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.get("/cart", response_model=List[CartItem])
-async def get_cart(current_user: User = Depends(get_current_user)):
+def get_cart(current_user: User = Depends(get_current_user),
+             connection: PooledConnection = Depends(get_db)):
     """Lista itens do carrinho do usuário"""
-    connection = get_db_connection()
-    if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT ci.id, ci.user_id, ci.product_id, ci.quantity,
-                   p.name as product_name, p.price as product_price,
-                   (ci.quantity * p.price) as total_price
-            FROM cart_items ci
-            JOIN products p ON ci.product_id = p.id
-            WHERE ci.user_id = %s
-            ORDER BY ci.created_at DESC
-        """, (current_user.id,))
-        
-        cart_items = cursor.fetchall()
-        return [CartItem(**item) for item in cart_items]
+        return json_rows_response(CartItem, cart_store.items(connection, current_user.id))
         
     except Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
 
 @app.delete("/cart/{item_id}")
-async def remove_from_cart(item_id: int, current_user: User = Depends(get_current_user)):
+def remove_from_cart(item_id: int, current_user: User = Depends(get_current_user),
+                     connection: PooledConnection = Depends(get_db)):
     """Remove item do carrinho"""
-    connection = get_db_connection()
-    if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    
     try:
-        cursor = connection.cursor()
-        cursor.execute("""
-            DELETE FROM cart_items WHERE id = %s AND user_id = %s
-        """, (item_id, current_user.id))
-        
-        if cursor.rowcount == 0:
+        if not cart_store.remove(connection, current_user.id, item_id):
             raise HTTPException(status_code=404, detail="Cart item not found")
-        
-        connection.commit()
+        mark_user_write(current_user.username, connection)
         return {"message": "Item removed from cart"}
         
     except Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
 
-# Endpoints de pedidos
-@app.post("/orders/checkout", response_model=Order)
-async def checkout_order(order_data: OrderCreate, current_user: User = Depends(get_current_user)):
-    """Finaliza pedido e cria ordem"""
-    connection = get_db_connection()
-    if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
+# Rollups de vendas: totais por dia, por produto/dia e por categoria/dia, somados pelo checkout na
+# própria transação. Cada checkout grava em um slot sorteado do dia: com uma única linha por dia,
+# todos os checkouts disputariam o mesmo lock até o commit. As leituras somam os slots.
+SALES_ROLLUP_SLOTS = int(os.getenv('SALES_ROLLUP_SLOTS', '8'))
+
+def record_sale(cursor, day: date, items):
+    """Soma um pedido aos rollups do dia; items são (product_id, quantity, price, category_id)"""
+    slot = random.randrange(SALES_ROLLUP_SLOTS)
+    units = sum(quantity for _, quantity, _, _ in items)
+    revenue = sum(quantity * price for _, quantity, price, _ in items)
+    cursor.execute("""
+        INSERT INTO sales_daily (day, slot, orders, units, revenue)
+        VALUES (%s, %s, 1, %s, %s)
+        ON DUPLICATE KEY UPDATE orders = orders + 1, units = units + VALUES(units),
+                                revenue = revenue + VALUES(revenue)
+    """, (day, slot, units, revenue))
+    
+    # Linhas sempre na mesma ordem (por id) para não criar deadlock entre checkouts
+    cursor.executemany("""
+        INSERT INTO sales_product_daily (day, product_id, slot, units, revenue)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE units = units + VALUES(units), revenue = revenue + VALUES(revenue)
+    """, [(day, product_id, slot, quantity, quantity * price)
+          for product_id, quantity, price, _ in sorted(items)])
     
+    categories = {}
+    for _, quantity, price, category_id in items:
+        totals = categories.setdefault(category_id or 0, [0, 0])  # 0 = sem categoria
+        totals[0] += quantity
+        totals[1] += quantity * price
+    cursor.executemany("""
+        INSERT INTO sales_category_daily (day, category_id, slot, units, revenue)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE units = units + VALUES(units), revenue = revenue + VALUES(revenue)
+    """, [(day, category_id, slot, units, revenue)
+          for category_id, (units, revenue) in sorted(categories.items())])
+
+def backfill_rollups(connection, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """Reconstrói os rollups de start a end (inclusive; padrão: todo o histórico) a partir dos pedidos.
+
+    Roda em uma única transação: as linhas do período ficam travadas e os checkouts do dia
+    corrente esperam até o commit. Devolve o número de dias com vendas.
+    """
+    cursor = connection.cursor()
     try:
-        cursor = connection.cursor()
+        if start is None or end is None:
+            cursor.execute("SELECT MIN(created_at), MAX(created_at) FROM orders")
+            first, last = cursor.fetchone()
+            if first is None:
+                return 0
+            start = start or first.date()
+            end = end or last.date()
+        range_params = (start, end)
+        order_range = (datetime.combine(start, datetime.min.time()),
+                       datetime.combine(end + timedelta(days=1), datetime.min.time()))
         
-        # Obter itens do carrinho
+        for table in ("sales_daily", "sales_product_daily", "sales_category_daily"):
+            cursor.execute(f"DELETE FROM {table} WHERE day BETWEEN %s AND %s", range_params)
         cursor.execute("""
-            SELECT ci.product_id, ci.quantity, p.price
-            FROM cart_items ci
-            JOIN products p ON ci.product_id = p.id
-            WHERE ci.user_id = %s
-        """, (current_user.id,))
-        
-        cart_items = cursor.fetchall()
-        
-        if not cart_items:
-            raise HTTPException(status_code=400, detail="Cart is empty")
-        
-        # Calcular total
-        total_amount = sum(item[1] * item[2] for item in cart_items)
-        
-        # Criar pedido
+            INSERT INTO sales_daily (day, slot, orders, units, revenue)
+            SELECT DATE(o.created_at), 0, COUNT(DISTINCT o.id), SUM(oi.quantity), SUM(oi.quantity * oi.price)
+            FROM orders o JOIN order_items oi ON oi.order_id = o.id
+            WHERE o.created_at >= %s AND o.created_at < %s
+            GROUP BY DATE(o.created_at)
+        """, order_range)
+        days = cursor.rowcount
         cursor.execute("""
-            INSERT INTO orders (user_id, total_amount, shipping_address, payment_method)
-            VALUES (%s, %s, %s, %s)
-        """, (current_user.id, total_amount, order_data.shipping_address, order_data.payment_method))
-        
-        order_id = cursor.lastrowid
-        
-        # Criar itens do pedido e atualizar estoque
-        for product_id, quantity, price in cart_items:
-            cursor.execute("""
-                INSERT INTO order_items (order_id, product_id, quantity, price)
-                VALUES (%s, %s, %s, %s)
-            """, (order_id, product_id, quantity, price))
-            
-            # Atualizar estoque
-            cursor.execute("""
-                UPDATE products SET stock = stock - %s WHERE id = %s
-            """, (quantity, product_id))
-        
-        # Limpar carrinho
-        cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (current_user.id,))
-        
-        connection.commit()
-        
-        # Retornar dados do pedido
-        cursor.execute("SELECT * FROM orders WHERE id = %s", (order_id,))
-        order = cursor.fetchone()
-        
+            INSERT INTO sales_product_daily (day, product_id, slot, units, revenue)
+            SELECT DATE(o.created_at), oi.product_id, 0, SUM(oi.quantity), SUM(oi.quantity * oi.price)
+            FROM orders o JOIN order_items oi ON oi.order_id = o.id
+            WHERE o.created_at >= %s AND o.created_at < %s
+            GROUP BY DATE(o.created_at), oi.product_id
+        """, order_range)
         cursor.execute("""
-            SELECT product_id, quantity, price FROM order_items WHERE order_id = %s
-        """, (order_id,))
-        order_items = cursor.fetchall()
-        
-        order_data = {
-            'id': order[0],
-            'user_id': order[1],
-            'total_amount': order[2],
-            'shipping_address': order[3],
-            'payment_method': order[4],
-            'status': order[5],
-            'created_at': order[6],
-            'items': [OrderItem(product_id=item[0], quantity=item[1], price=item[2]) for item in order_items]
-        }
-        
-        return Order(**order_data)
-        
-    except Error as e:
+            INSERT INTO sales_category_daily (day, category_id, slot, units, revenue)
+            SELECT DATE(o.created_at), COALESCE(p.category_id, 0), 0,
+                   SUM(oi.quantity), SUM(oi.quantity * oi.price)
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.id
+            JOIN products p ON p.id = oi.product_id
+            WHERE o.created_at >= %s AND o.created_at < %s
+            GROUP BY DATE(o.created_at), COALESCE(p.category_id, 0)
+        """, order_range)
+        connection.commit()
+        return days
+    except Error:
         connection.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        raise
     finally:
-        if connection.is_connected():
+        cursor.close()
+
+# Endpoints de pedidos
+CHECKOUT_RETRIES = int(os.getenv('CHECKOUT_RETRIES', '3'))
+RETRYABLE_ERRORS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+def place_order(cursor, user_id: int, order_data: OrderCreate):
+    """Cria o pedido a partir do carrinho dentro da transação corrente (sem commit).
+
+    Devolve o pedido e os ids dos produtos cujo estoque mudou (itens e reservas devolvidas).
+    """
+    # Travar o carrinho impede que dois checkouts simultâneos usem os mesmos itens
+    cursor.execute("""
+        SELECT product_id, quantity FROM cart_items
+        WHERE user_id = %s
+        ORDER BY product_id
+        FOR UPDATE
+    """, (user_id,))
+    cart_items = cursor.fetchall()
+    
+    if not cart_items:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    if any(quantity <= 0 for _, quantity in cart_items):
+        raise HTTPException(status_code=400, detail="Invalid quantity in cart")
+    
+    # Leitura sem FOR UPDATE: a linha de um produto quente seria o ponto de disputa de todos os
+    # checkouts. Quem garante o estoque são as baixas condicionais abaixo.
+    product_ids = [product_id for product_id, _ in cart_items]
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(f"""
+        SELECT id, price, stock, category_id, stock_slots FROM products
+        WHERE id IN ({placeholders})
+        ORDER BY id
+    """, product_ids)
+    products = {row[0]: row[1:] for row in cursor.fetchall()}  # id -> (price, stock, category_id, slots)
+    
+    missing = [product_id for product_id in product_ids if product_id not in products]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Insufficient stock for products: {', '.join(map(str, missing))}",
+        )
+    
+    # O que foi reservado ao adicionar ao carrinho já saiu do estoque; produtos quentes têm o
+    # restante baixado dos slots, e os demais ficam para o UPDATE em lote
+    pending, returned = consume_reservations(cursor, user_id, cart_items,
+                                             {product_id: row[3] for product_id, row in products.items()})
+    short = [product_id for product_id, need in pending.items() if products[product_id][1] < need]
+    if short:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Insufficient stock for products: {', '.join(map(str, short))}",
+        )
+    
+    # Baixa de estoque em um único UPDATE condicional, antes dos INSERTs (que travariam as linhas
+    # dos produtos só para leitura pela chave estrangeira): se alguma linha não tiver estoque
+    # suficiente, o número de linhas alteradas não bate e o pedido é desfeito
+    if pending:
+        cases = " ".join(["WHEN %s THEN %s"] * len(pending))
+        quantities = [value for product_id, need in sorted(pending.items()) for value in (product_id, need)]
+        pending_placeholders = ", ".join(["%s"] * len(pending))
+        cursor.execute(f"""
+            UPDATE products
+            SET stock = stock - CASE id {cases} END
+            WHERE id IN ({pending_placeholders}) AND stock_slots = 0 AND stock >= CASE id {cases} END
+        """, (*quantities, *sorted(pending), *quantities))
+        if cursor.rowcount != len(pending):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Insufficient stock")
+    
+    # Calcular total
+    items = [(product_id, quantity, products[product_id][0]) for product_id, quantity in cart_items]
+    total_amount = sum(quantity * price for _, quantity, price in items)
+    
+    # Criar pedido; created_at vai explícito para montar a resposta sem reler a linha
+    created_at = datetime.now().replace(microsecond=0)
+    cursor.execute("""
+        INSERT INTO orders (user_id, total_amount, shipping_address, payment_method, status, created_at)
+        VALUES (%s, %s, %s, %s, 'pending', %s)
+    """, (user_id, total_amount, order_data.shipping_address, order_data.payment_method, created_at))
+    order_id = cursor.lastrowid
+    
+    # Itens do pedido em um único INSERT de várias linhas
+    cursor.executemany("""
+        INSERT INTO order_items (order_id, product_id, quantity, price)
+        VALUES (%s, %s, %s, %s)
+    """, [(order_id, product_id, quantity, price) for product_id, quantity, price in items])
+    
+    record_sale(cursor, created_at.date(),
+                [(product_id, quantity, price, products[product_id][2]) for product_id, quantity, price in items])
+    
+    # Limpar carrinho
+    cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (user_id,))
+    
+    # O restante (pagamento, confirmação, mudanças de status) roda nos workers da fila,
+    # mas o job é gravado na mesma transação: pedido confirmado nunca fica sem processamento
+    enqueue_job(cursor, "process_order", {"order_id": order_id})
+    
+    order = Order(
+        id=order_id,
+        user_id=user_id,
+        total_amount=total_amount,
+        shipping_address=order_data.shipping_address,
+        payment_method=order_data.payment_method,
+        status="pending",
+        created_at=created_at,
+        items=[OrderItem(product_id=product_id, quantity=quantity, price=price)
+               for product_id, quantity, price in items],
+    )
+    return order, sorted(set(product_ids) | set(returned))
+
+@app.post("/orders/checkout", response_model=Order, dependencies=[Depends(rate_limit_by_user("checkout"))])
+def checkout_order(order_data: OrderCreate, current_user: User = Depends(get_current_user),
+                   connection: PooledConnection = Depends(get_db)):
+    """Finaliza pedido e cria ordem"""
+    for attempt in range(CHECKOUT_RETRIES + 1):
+        cursor = connection.cursor()
+        try:
+            with cart_store.checkout(connection, cursor, current_user.id):
+                order, changed = place_order(cursor, current_user.id, order_data)
+                cache_sync.publish(cursor, "product", changed)
+                connection.commit()
+            job_wakeup.set()
+            mark_user_write(current_user.username, connection)
+            invalidate_catalog_cache(changed)
+            return order
+            
+        except HTTPException:
+            connection.rollback()
+            raise
+        except Error as e:
+            connection.rollback()
+            if e.errno in RETRYABLE_ERRORS and attempt < CHECKOUT_RETRIES:
+                continue
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        finally:
             cursor.close()
-            connection.close()
+
+ORDER_PAGE_SIZE = int(os.getenv('ORDER_PAGE_SIZE', '20'))
+ORDER_PAGE_MAX = int(os.getenv('ORDER_PAGE_MAX', '100'))
+
+def order_list_query(conditions: List[str]) -> str:
+    """SELECT de uma página de GET /orders (o último parâmetro é o LIMIT)"""
+    return f"""
+        SELECT * FROM orders WHERE {' AND '.join(conditions)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """
+
+def order_items_query(count: int) -> str:
+    """Itens de `count` pedidos em uma única consulta"""
+    placeholders = ", ".join(["%s"] * count)
+    return f"""
+        SELECT order_id, product_id, quantity, price FROM order_items
+        WHERE order_id IN ({placeholders})
+        ORDER BY order_id, id
+    """
 
 @app.get("/orders", response_model=List[Order])
-async def get_user_orders(current_user: User = Depends(get_current_user)):
-    """Lista pedidos do usuário"""
-    connection = get_db_connection()
-    if not connection:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    
+def get_user_orders(limit: int = Query(ORDER_PAGE_SIZE, ge=1, le=ORDER_PAGE_MAX),
+                    after: Optional[str] = None,
+                    current_user: User = Depends(get_current_user),
+                    connection: PooledConnection = Depends(get_db)):
+    """Lista pedidos do usuário, do mais recente ao mais antigo (cabeçalho X-Next-Cursor)"""
+    conditions = ["user_id = %s"]
+    params = [current_user.id]
+    if after:
+        conditions.append(keyset_condition("created_at", True))
+        params.extend(keyset_params(after))
+
     try:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT * FROM orders WHERE user_id = %s ORDER BY created_at DESC
-        """, (current_user.id,))
+        cursor.execute(order_list_query(conditions), (*params, limit + 1))
         
         orders = cursor.fetchall()
+        headers = {}
+        if len(orders) > limit:
+            orders = orders[:limit]
+            last = orders[-1]
+            headers["X-Next-Cursor"] = encode_cursor(last['created_at'], last['id'])
+        if not orders:
+            return []
+        
+        # Itens de todos os pedidos da página em uma única consulta
+        order_ids = [order['id'] for order in orders]
+        cursor.execute(order_items_query(len(order_ids)), order_ids)
         
-        result = []
+        items_by_order = {order_id: [] for order_id in order_ids}
+        for item in cursor.fetchall():
+            items_by_order[item['order_id']].append(item)
         for order in orders:
-            cursor.execute("""
-                SELECT product_id, quantity, price FROM order_items WHERE order_id = %s
-            """, (order['id'],))
-            order_items = cursor.fetchall()
-            
-            order['items'] = [OrderItem(**item) for item in order_items]
-            result.append(Order(**order))
+            order['items'] = items_by_order[order['id']]
         
-        return result
+        return json_rows_response(Order, orders, headers)
+        
+    except Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        cursor.close()
+
+@app.get("/orders/{order_id}/status", response_model=OrderStatus)
+def get_order_status(order_id: int, current_user: User = Depends(get_current_user),
+                     connection: PooledConnection = Depends(get_db)):
+    """Status atual de um pedido do usuário (para acompanhar o processamento em segundo plano)"""
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT id, status FROM orders WHERE id = %s AND user_id = %s",
+                       (order_id, current_user.id))
+        order = cursor.fetchone()
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        return order
         
     except Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
-        if connection.is_connected():
+        cursor.close()
+
+# Fila de jobs persistida na tabela `jobs`, processada por threads de worker.
+# Um job é reservado com um UPDATE atômico que grava um token de reserva e adia o run_at pelo
+# tempo de lease: se o worker morrer, o job volta a ficar elegível quando o lease vence.
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_BATCH_SIZE = int(os.getenv('JOB_BATCH_SIZE', '10'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '60'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE = int(os.getenv('JOB_RETRY_BASE', '5'))  # segundos; dobra a cada tentativa
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+JOB_PRUNE_INTERVAL = 3600
+
+job_wakeup = threading.Event()
+job_stop = threading.Event()
+job_threads: List[threading.Thread] = []
+_job_pruned_at = [float("-inf")]
+_job_prune_lock = threading.Lock()
+jobs_total = Counter("jobs_total", "Jobs processados pelos workers", ("kind", "outcome"))
+
+def enqueue_job(cursor, kind: str, payload: dict, delay: int = 0):
+    """Grava um job na transação corrente; ele só fica visível aos workers após o commit"""
+    cursor.execute("""
+        INSERT INTO jobs (kind, payload, max_attempts, run_at)
+        VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND)
+    """, (kind, json.dumps(payload), JOB_MAX_ATTEMPTS, delay))
+
+def process_order(cursor, payload: dict):
+    """Pagamento e início do processamento; a captura do pagamento entra aqui quando houver gateway"""
+    cursor.execute("UPDATE orders SET status = 'processing' WHERE id = %s AND status = 'pending'",
+                   (payload["order_id"],))
+    if cursor.rowcount:
+        enqueue_job(cursor, "order_confirmation", payload)
+
+def send_order_confirmation(cursor, payload: dict):
+    """Confirmação do pedido ao cliente; sem servidor de e-mail configurado, apenas registra no log"""
+    cursor.execute("""
+        SELECT o.id, o.total_amount, u.email FROM orders o JOIN users u ON u.id = o.user_id
+        WHERE o.id = %s
+    """, (payload["order_id"],))
+    order = cursor.fetchone()
+    if order:
+        print(f" Confirmação do pedido {order[0]} (R$ {order[1]}) para {order[2]}")
+
+JOB_HANDLERS = {
+    "process_order": process_order,
+    "order_confirmation": send_order_confirmation,
+}
+
+def claim_jobs(connection, limit: int) -> List[dict]:
+    """Reserva até `limit` jobs vencidos; um job em execução cujo lease venceu volta a ser reservado"""
+    claim = uuid.uuid4().hex
+    cursor = connection.cursor(dictionary=True)
+    try:
+        # Lease vencido na última tentativa (o worker morreu no meio, talvez por causa do próprio
+        # job): falha de vez, em vez de ser reservado de novo para sempre
+        cursor.execute("""
+            UPDATE jobs SET status = 'failed', last_error = COALESCE(last_error, 'Lease expired')
+            WHERE status = 'running' AND run_at <= NOW() AND attempts >= max_attempts
+        """)
+        cursor.execute("""
+            UPDATE jobs
+            SET status = 'running', claimed_by = %s, attempts = attempts + 1,
+                run_at = NOW() + INTERVAL %s SECOND
+            WHERE status IN ('queued', 'running') AND run_at <= NOW() AND attempts < max_attempts
+            ORDER BY id
+            LIMIT %s
+        """, (claim, JOB_LEASE_SECONDS, limit))
+        connection.commit()
+        if cursor.rowcount == 0:
+            return []
+        cursor.execute("""
+            SELECT id, kind, payload, attempts, max_attempts, claimed_by FROM jobs
+            WHERE claimed_by = %s AND status = 'running'
+            ORDER BY id
+        """, (claim,))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def run_job(connection, job: dict):
+    """Executa o job e marca o resultado na mesma transação das alterações que ele fez"""
+    cursor = connection.cursor()
+    try:
+        try:
+            handler = JOB_HANDLERS[job['kind']]
+            payload = job['payload']
+            handler(cursor, json.loads(payload.decode() if isinstance(payload, bytes) else payload))
+            cursor.execute("UPDATE jobs SET status = 'done', last_error = NULL WHERE id = %s AND claimed_by = %s",
+                           (job['id'], job['claimed_by']))
+            if cursor.rowcount == 0:
+                # Lease vencido e job reservado por outro worker: descarta o que este fez
+                connection.rollback()
+                return
+            connection.commit()
+            jobs_total.inc((job['kind'], "done"))
+        except Exception as e:
+            connection.rollback()
+            failed = job['attempts'] >= job['max_attempts']
+            delay = JOB_RETRY_BASE * 2 ** (job['attempts'] - 1)
+            cursor.execute("""
+                UPDATE jobs SET status = %s, last_error = %s, run_at = NOW() + INTERVAL %s SECOND
+                WHERE id = %s AND claimed_by = %s
+            """, ("failed" if failed else "queued", f"{type(e).__name__}: {e}"[:1000], delay,
+                  job['id'], job['claimed_by']))
+            connection.commit()
+            jobs_total.inc((job['kind'], "failed" if failed else "retry"))
+            print(f"Erro no job {job['id']} ({job['kind']}, tentativa {job['attempts']}): {e}")
+    finally:
+        cursor.close()
+
+def prune_jobs(connection):
+    """Apaga jobs concluídos mais antigos que JOB_RETENTION_DAYS (no máximo uma vez por intervalo)"""
+    with _job_prune_lock:
+        if time.monotonic() - _job_pruned_at[0] < JOB_PRUNE_INTERVAL:
+            return
+        _job_pruned_at[0] = time.monotonic()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("DELETE FROM jobs WHERE status = 'done' AND run_at < NOW() - INTERVAL %s DAY LIMIT 10000",
+                       (JOB_RETENTION_DAYS,))
+        connection.commit()
+    finally:
+        cursor.close()
+
+def job_worker():
+    while not job_stop.is_set():
+        jobs = []
+        try:
+            with borrow_connection() as connection:
+                jobs = claim_jobs(connection, JOB_BATCH_SIZE)
+                for job in jobs:
+                    if job_stop.is_set():
+                        break  # os restantes voltam para a fila quando o lease vencer
+                    run_job(connection, job)
+                if not jobs:
+                    prune_jobs(connection)
+        except (Error, HTTPException) as e:
+            print(f"Erro no worker de jobs: {e}")
+        if len(jobs) < JOB_BATCH_SIZE:
+            # Fila vazia: espera o próximo checkout deste processo ou o intervalo de polling
+            job_wakeup.wait(JOB_POLL_INTERVAL)
+            job_wakeup.clear()
+
+def inventory_worker():
+    """Manutenção do estoque a cada INVENTORY_SWEEP_INTERVAL, independente da fila de jobs.
+
+    Numa thread própria: no caminho de fila vazia dos workers ela nunca rodaria com checkouts
+    constantes, e as reservas vencidas não voltariam ao estoque.
+    """
+    while not job_stop.is_set():
+        try:
+            with borrow_connection() as connection:
+                maintain_inventory(connection)
+        except (Error, HTTPException) as e:
+            print(f"Erro na manutenção do estoque: {e}")
+        job_stop.wait(INVENTORY_SWEEP_INTERVAL)
+
+def start_job_workers(count: int = JOB_WORKERS):
+    job_stop.clear()
+    for i in range(count):
+        thread = threading.Thread(target=job_worker, name=f"jobs-{i}", daemon=True)
+        thread.start()
+        job_threads.append(thread)
+    if count:
+        thread = threading.Thread(target=inventory_worker, name="inventory", daemon=True)
+        thread.start()
+        job_threads.append(thread)
+
+def stop_job_workers(timeout: float = 5):
+    job_stop.set()
+    job_wakeup.set()
+    for thread in job_threads:
+        thread.join(timeout)
+    job_threads.clear()
+
+# Endpoints de exportação
+EXPORTS = {
+    "products": "SELECT id, name, description, price, stock, category_id, image_url, created_at "
+                "FROM products ORDER BY id",
+    "orders": "SELECT id, user_id, total_amount, shipping_address, payment_method, status, created_at "
+              "FROM orders ORDER BY id",
+    "order_items": "SELECT id, order_id, product_id, quantity, price FROM order_items ORDER BY id",
+}
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def stream_export(connection: PooledConnection, query: str, fmt: str):
+    """Gera o export em blocos lendo com cursor sem buffer; a memória não cresce com o tamanho da tabela"""
+    finished = False
+    try:
+        cursor = connection.cursor(buffered=False)
+        # Consumidores lentos não devem derrubar a conexão no meio do dump
+        cursor.execute("SET SESSION net_write_timeout = 600")
+        cursor.execute(query)
+        columns = cursor.column_names
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            if fmt == "csv":
+                writer.writerows([_csv_value(v) for v in row] for row in rows)
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                yield b"".join(orjson.dumps(dict(zip(columns, row)), default=str) + b"\n" for row in rows)
+        # A conexão volta ao pool: o timeout longo não pode valer para quem a pegar depois
+        cursor.execute("SET SESSION net_write_timeout = DEFAULT")
+        finished = True
+        cursor.close()
+    finally:
+        if not finished:
+            # Sobrou resultado não lido no socket (e o timeout longo): mais barato descartar a conexão
+            connection.invalidate()
+        connection.close()
+
+def close_export(rows, connection: PooledConnection):
+    """Tarefa de fundo do export: roda ao fim da resposta, inclusive quando o cliente desconecta.
+
+    Sem ela, um gerador abandonado só devolveria a conexão quando fosse coletado, e um que nem
+    chegou a começar (desconexão antes do primeiro bloco) não a devolveria nunca.
+    """
+    # Um fetchmany ainda pode estar rodando no threadpool; close() falharia com o gerador ativo
+    while rows.gi_running:
+        time.sleep(0.05)
+    rows.close()
+    connection.close()
+
+@app.get("/export/{resource}")
+def export_table(resource: str, request: Request, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Exporta products, orders ou order_items em NDJSON ou CSV, em streaming"""
+    if not EXPORT_API_KEY:
+        raise HTTPException(status_code=403, detail="Export disabled")
+    if not hmac.compare_digest(request.headers.get("x-api-key", ""), EXPORT_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    if resource not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export, use one of: {', '.join(EXPORTS)}")
+
+    try:
+        connection = acquire_from(read_pool())
+    except PoolTimeoutError:
+        raise HTTPException(status_code=503, detail="Database busy, try again", headers={"Retry-After": "1"})
+    except Error:
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    rows = stream_export(connection, EXPORTS[resource], format)
+    return StreamingResponse(
+        rows,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{resource}.{format}"'},
+        background=BackgroundTask(close_export, rows, connection),
+    )
+
+# Endpoints de análise
+SALES_DAYS_QUERY = """
+    SELECT day, SUM(orders) AS orders, SUM(units) AS units, SUM(revenue) AS revenue
+    FROM sales_daily
+    WHERE day BETWEEN %s AND %s
+    GROUP BY day
+    ORDER BY day
+"""
+SALES_PRODUCTS_QUERY = """
+    SELECT s.product_id, p.name AS product_name,
+           SUM(s.units) AS units, SUM(s.revenue) AS revenue
+    FROM sales_product_daily s
+    LEFT JOIN products p ON p.id = s.product_id
+    WHERE s.day BETWEEN %s AND %s
+    GROUP BY s.product_id, p.name
+    ORDER BY revenue DESC, s.product_id
+    LIMIT %s
+"""
+SALES_CATEGORIES_QUERY = """
+    SELECT NULLIF(s.category_id, 0) AS category_id, c.name AS category_name,
+           SUM(s.units) AS units, SUM(s.revenue) AS revenue
+    FROM sales_category_daily s
+    LEFT JOIN categories c ON c.id = s.category_id
+    WHERE s.day BETWEEN %s AND %s
+    GROUP BY s.category_id, c.name
+    ORDER BY revenue DESC, s.category_id
+"""
+
+@app.get("/analytics/sales", response_model=SalesReport)
+def sales_report(request: Request, start: Optional[date] = None, end: Optional[date] = None,
+                 limit: int = Query(10, ge=1, le=100)):
+    """Vendas por dia, produtos e categorias mais vendidos no período (padrão: últimos 30 dias)"""
+    if not ANALYTICS_API_KEY:
+        raise HTTPException(status_code=403, detail="Analytics disabled")
+    if not hmac.compare_digest(request.headers.get("x-api-key", ""), ANALYTICS_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days >= ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range too large, max {ANALYTICS_MAX_DAYS} days")
+
+    # Só tabelas de rollup (nunca orders/order_items); podem vir da réplica
+    with borrow_connection(read_pool()) as connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(SALES_DAYS_QUERY, (start, end))
+            days = cursor.fetchall()
+            cursor.execute(SALES_PRODUCTS_QUERY, (start, end, limit))
+            products = cursor.fetchall()
+            cursor.execute(SALES_CATEGORIES_QUERY, (start, end))
+            categories = cursor.fetchall()
+            
+        except Error as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        finally:
             cursor.close()
-            connection.close()
+
+    return SalesReport(
+        start=start,
+        end=end,
+        orders=sum(day['orders'] for day in days),
+        units=sum(day['units'] for day in days),
+        revenue=sum((day['revenue'] for day in days), Decimal("0")),
+        days=days,
+        products=products,
+        categories=categories,
+    )
+
+# Consultas mais frequentes, conferidas com EXPLAIN por `python main.py check-indexes` e pelos
+# testes. Usam as mesmas constantes e funções que os endpoints, para não se desatualizarem.
+HOT_QUERIES = [
+    ("GET /products", product_list_query([], "name", False), (PRODUCT_PAGE_SIZE + 1,)),
+    ("GET /products?category_id", product_list_query(["category_id = %s"], "name", False),
+     (1, PRODUCT_PAGE_SIZE + 1)),
+    ("GET /products?category_id&sort=price", product_list_query(["category_id = %s"], "price", False),
+     (1, PRODUCT_PAGE_SIZE + 1)),
+    ("GET /products?after", product_list_query([keyset_condition("name", False)], "name", False),
+     ("m", "m", 1, PRODUCT_PAGE_SIZE + 1)),
+    ("GET /products?category_id&sort=price&after",
+     product_list_query(["category_id = %s", keyset_condition("price", False)], "price", False),
+     (1, 10, 10, 1, PRODUCT_PAGE_SIZE + 1)),
+    ("GET /products?min_price&max_price&sort=price",
+     product_list_query(["price >= %s", "price <= %s"], "price", False), (10, 100, PRODUCT_PAGE_SIZE + 1)),
+    ("GET /products/{id}", PRODUCT_BY_ID_QUERY, (1,)),
+    ("get_current_user", USER_BY_USERNAME_QUERY, ("admin",)),
+    ("GET /cart", CART_QUERY, (1,)),
+    ("GET /orders", order_list_query(["user_id = %s"]), (1, ORDER_PAGE_SIZE + 1)),
+    ("GET /orders?after", order_list_query(["user_id = %s", keyset_condition("created_at", True)]),
+     (1, "2024-01-01", "2024-01-01", 1, ORDER_PAGE_SIZE + 1)),
+    ("GET /orders (itens)", order_items_query(2), (1, 2)),
+    ("GET /analytics/sales", SALES_DAYS_QUERY, ("2024-01-01", "2024-01-31")),
+    ("GET /analytics/sales (produtos)", SALES_PRODUCTS_QUERY, ("2024-01-01", "2024-01-31", 10)),
+    ("GET /analytics/sales (categorias)", SALES_CATEGORIES_QUERY, ("2024-01-01", "2024-01-31")),
+]
+
+# Tipos de acesso do EXPLAIN que buscam no índice só as linhas pedidas
+INDEX_LOOKUP_TYPES = {"system", "const", "eq_ref", "ref", "ref_or_null", "range", "index_merge"}
+
+def plan_uses_index(plan: List[dict], limit: Optional[int] = None) -> bool:
+    """Se toda tabela do plano é lida por busca no índice.
+
+    `type = index` é uma varredura do índice inteiro: só passa quando o ORDER BY segue o índice
+    e o LIMIT a interrompe (o EXPLAIN estima no máximo `limit` linhas), como em GET /products.
+    """
+    for row in plan:
+        if not row.get('key'):
+            return False
+        if row.get('type') in INDEX_LOOKUP_TYPES:
+            continue
+        if row.get('type') == 'index' and limit is not None and (row.get('rows') or 0) <= limit:
+            continue
+        return False
+    return True
+
+def explain_hot_queries(connection) -> List[dict]:
+    """Roda EXPLAIN em cada consulta de HOT_QUERIES e indica se ela usa índice"""
+    cursor = connection.cursor(dictionary=True)
+    results = []
+    try:
+        for name, query, params in HOT_QUERIES:
+            cursor.execute("EXPLAIN " + query, params)
+            plan = cursor.fetchall()
+            limit = params[-1] if query.rstrip().endswith("LIMIT %s") else None
+            results.append({'query': name, 'uses_index': plan_uses_index(plan, limit), 'plan': plan})
+        return results
+    finally:
+        cursor.close()
+
+# Aquecimento: antes de a instância se declarar pronta (GET /health/ready), abre as conexões do
+# pool, carrega no cache as categorias e os produtos mais vendidos e exercita as bibliotecas
+# que só carregam no primeiro uso (backend do bcrypt, JWT). Roda em segundo plano depois da
+# startup, para que /health/live responda desde o início; se o banco ainda não estiver acessível,
+# a inicialização é repetida a cada STARTUP_RETRY_INTERVAL até conseguir.
+WARMUP_TOP_PRODUCTS = int(os.getenv('WARMUP_TOP_PRODUCTS', '200'))
+WARMUP_SALES_DAYS = int(os.getenv('WARMUP_SALES_DAYS', '30'))
+STARTUP_RETRY_INTERVAL = float(os.getenv('STARTUP_RETRY_INTERVAL', '5'))
+HEALTH_PING_TIMEOUT = int(os.getenv('HEALTH_PING_TIMEOUT', '2'))  # segundos
+
+app_ready = threading.Event()
+startup_stop = threading.Event()
+startup_threads: List[threading.Thread] = []
+warmup_state = {'started_at': None, 'finished_at': None, 'duration_ms': None, 'init_attempts': 0,
+                'steps': {}, 'errors': {}}
+
+def warm_pools():
+    opened = {'primary': db_pool.prefill()}
+    if replica_pool is not None:
+        opened['replica'] = replica_pool.prefill()
+    return opened
+
+def warm_catalog():
+    """Coloca no catalog_cache as categorias e os produtos mais vendidos nos últimos dias"""
+    since = date.today() - timedelta(days=WARMUP_SALES_DAYS)
+    version = catalog_cache.version()
+    with borrow_connection(read_pool()) as connection:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT * FROM categories ORDER BY name")
+            prime_cache(catalog_cache, ("categories",), Category, cursor.fetchall(), version)
+            # Sem vendas no período, completa com os primeiros produtos por id
+            cursor.execute("""
+                SELECT p.* FROM products p
+                LEFT JOIN (
+                    SELECT product_id, SUM(units) AS units FROM sales_product_daily
+                    WHERE day >= %s GROUP BY product_id
+                ) s ON s.product_id = p.id
+                ORDER BY COALESCE(s.units, 0) DESC, p.id
+                LIMIT %s
+            """, (since, WARMUP_TOP_PRODUCTS))
+            products = cursor.fetchall()
+        finally:
+            cursor.close()
+    for product in products:
+        prime_cache(catalog_cache, ("product", product['id']), Product, product, version)
+    return {'categories': 1, 'products': len(products)}
+
+def warm_libraries():
+    """Carrega o backend do bcrypt e exercita JWT e serialização fora do caminho das requisições"""
+    pwd_context.verify("warm-up", pwd_context.hash("warm-up"))
+    jwt.decode(jwt.encode({"sub": "warm-up"}, SECRET_KEY, algorithm=ALGORITHM), SECRET_KEY,
+               algorithms=[ALGORITHM])
+    render_json(Product, [])
+    return True
+
+def warm_up():
+    """Executa os passos de aquecimento e marca a instância como pronta (falhas ficam registradas)"""
+    started = time.monotonic()
+    warmup_state['started_at'] = datetime.utcnow().isoformat()
+    for name, step in (("pool", warm_pools), ("catalog", warm_catalog), ("libraries", warm_libraries)):
+        try:
+            warmup_state['steps'][name] = step()
+        except Exception as e:
+            warmup_state['errors'][name] = str(e)
+            print(f"Erro no aquecimento ({name}): {e}")
+    warmup_state['duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+    warmup_state['finished_at'] = datetime.utcnow().isoformat()
+    app_ready.set()
+    print(f" Aquecimento concluído em {warmup_state['duration_ms']} ms")
+
+class DatabaseProbe:
+    """Conexão própria do readiness, fora do pool.
+
+    Com o pool saturado, um SELECT 1 emprestado esperaria DB_POOL_TIMEOUT e a instância sairia
+    do balanceador justamente por estar ocupada. A conexão é reaberta se cair, e conexão e
+    consulta têm limite de HEALTH_PING_TIMEOUT.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def ping(self) -> dict:
+        """Executa SELECT 1 e mede a latência"""
+        started = time.monotonic()
+        # Probes simultâneos usam a mesma conexão; um anterior ainda preso conta como falha
+        if not self._lock.acquire(timeout=HEALTH_PING_TIMEOUT):
+            return {"status": "down", "error": "Previous health probe still running"}
+        try:
+            if self._connection is None:
+                self._connection = mysql.connector.connect(**self.config,
+                                                           connection_timeout=HEALTH_PING_TIMEOUT)
+            cursor = self._connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        except Error as e:
+            self._discard()
+            return {"status": "down", "error": str(e)}
+        finally:
+            self._lock.release()
+        return {"status": "up", "latency_ms": round((time.monotonic() - started) * 1000, 1)}
+
+    def _discard(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except Error:
+                pass
+
+    def close(self):
+        with self._lock:
+            self._discard()
+
+primary_probe = DatabaseProbe(DB_CONFIG)
+replica_probe = DatabaseProbe(DB_REPLICA_CONFIG) if DB_REPLICA_CONFIG else None
+# Threads só dos probes: com o threadpool das requisições esgotado, o readiness ainda responde
+probe_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="health-probe")
+
+def start_app():
+    """Inicializa o banco (repetindo até conseguir), sobe os serviços em segundo plano e aquece"""
+    while True:
+        warmup_state['init_attempts'] += 1
+        if init_database():
+            break
+        print(f" Erro ao inicializar banco de dados; nova tentativa em {STARTUP_RETRY_INTERVAL:g} s")
+        if startup_stop.wait(STARTUP_RETRY_INTERVAL):
+            return
+    print(" Banco de dados inicializado com sucesso!")
+    if build_search_index():
+        print(f" Índice de busca carregado: {search_index.stats()['documents']} produtos")
+    start_job_workers()
+    cart_store.start()
+    cache_sync.start()
+    warm_up()
 
 # Endpoint de inicialização
 @app.on_event("startup")
 async def startup_event():
-    """Inicializa o banco de dados na startup"""
+    """Dispara em segundo plano a inicialização do banco e o aquecimento"""
+    to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
     print("Inicializando banco de dados...")
-    if init_database():
-        print(" Banco de dados inicializado com sucesso!")
-    else:
-        print(" Erro ao inicializar banco de dados")
+    startup_stop.clear()
+    thread = threading.Thread(target=start_app, name="startup", daemon=True)
+    thread.start()
+    startup_threads.append(thread)
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Para os workers de jobs, grava os carrinhos pendentes, fecha as conexões ociosas do pool e encerra o pool de hash"""
+    # Interrompe as tentativas de inicialização antes de parar o que ela possa ter iniciado
+    startup_stop.set()
+    for thread in startup_threads:
+        thread.join(5)
+    startup_threads.clear()
+    stop_job_workers()
+    cache_sync.stop()
+    cart_store.stop()
+    db_pool.dispose()
+    if replica_pool is not None:
+        replica_pool.dispose()
+    primary_probe.close()
+    if replica_probe is not None:
+        replica_probe.close()
+    hash_executor.shutdown(wait=False)
+    probe_executor.shutdown(wait=False)
 
 # Endpoint de saúde
 @app.get("/health")
@@ -747,6 +3978,79 @@ async def health_check():
     """Verifica se a API está funcionando"""
     return {"status": "healthy", "message": "E-Commerce API is running"}
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness: o processo está de pé e o event loop responde (não consulta o banco)"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness: aquecimento concluído e banco acessível; 503 enquanto não puder receber tráfego"""
+    probes = [primary_probe] + ([replica_probe] if replica_probe is not None else [])
+    pings = await asyncio.gather(*(asyncio.wrap_future(probe_executor.submit(probe.ping)) for probe in probes))
+    database = pings[0]
+    body = {
+        "status": "ready",
+        "database": database,
+        "replica": pings[1] if replica_probe is not None else None,
+        "warm_up": warmup_state,
+    }
+    if not app_ready.is_set():
+        body["status"] = "warming_up" if warmup_state['started_at'] else "starting"
+    elif database["status"] != "up":
+        body["status"] = "unavailable"
+    if body["status"] != "ready":
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body)
+    return body
+
+@app.get("/health/pool")
+async def pool_stats():
+    """Estatísticas do pool de conexões MySQL (e da réplica, se configurada)"""
+    return {**db_pool.stats(), 'replica': replica_pool.stats() if replica_pool else None}
+
+@app.get("/health/cache")
+async def cache_stats():
+    """Estatísticas dos caches em memória"""
+    return {
+        "users": user_cache.stats(),
+        "tokens": token_cache.stats(),
+        "catalog": catalog_cache.stats(),
+        "search_index": search_index.stats(),
+        "cart": cart_store.stats(),
+        "sync": cache_sync.stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas no formato texto do Prometheus"""
+    lines = []
+    for family in (http_requests_total, http_request_duration, rate_limited_total, admission_rejected_total,
+                   db_queries_total, db_query_duration, replica_fallbacks_total, jobs_total):
+        lines.extend(family.render())
+    lines.extend(sample_lines("http_requests_in_flight", "Requisições HTTP em andamento",
+                              [({}, http_in_flight)]))
+    pools = {"primary": db_pool.stats()}
+    if replica_pool is not None:
+        pools["replica"] = replica_pool.stats()
+    lines.extend(sample_lines("db_pool_connections", "Conexões do pool por estado",
+                              [({"pool": name, "state": key}, stats[key]) for name, stats in pools.items()
+                               for key in ("open", "idle", "in_use", "overflow", "waiting")]))
+    for key in ("checkouts", "connects", "timeouts", "recycled", "invalidated"):
+        lines.extend(sample_lines(f"db_pool_{key}_total", f"Pool de conexões: {key}",
+                                  [({"pool": name}, stats[key]) for name, stats in pools.items()],
+                                  kind="counter"))
+    caches = {name: cache.stats() for name, cache in
+              (("users", user_cache), ("tokens", token_cache), ("catalog", catalog_cache))}
+    lines.extend(sample_lines("cache_entries", "Entradas nos caches em memória",
+                              [({"cache": name}, stats['size']) for name, stats in caches.items()]))
+    for key in ("hits", "misses", "evictions"):
+        lines.extend(sample_lines(f"cache_{key}_total", f"Caches em memória: {key}",
+                                  [({"cache": name}, stats[key]) for name, stats in caches.items()],
+                                  kind="counter"))
+    lines.extend(sample_lines("search_index_documents", "Produtos no índice de busca",
+                              [({}, search_index.stats()['documents'])]))
+    return "\n".join(lines) + "\n"
+
 # Endpoint raiz
 @app.get("/")
 async def root():
@@ -759,9 +4063,75 @@ async def root():
     }
 
 if __name__ == "__main__":
-    import uvicorn
-    print("🚀 Iniciando servidor E-Commerce API...")
-    print("📖 Documentação disponível em: http://localhost:8000/docs")
-    print("🔍 Health check em: http://localhost:8000/health")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    
+    if command == "migrate":
+        # Aplica migrações sem subir o servidor (ex.: passo de deploy)
+        connection = get_db_connection()
+        if not connection:
+            sys.exit(1)
+        try:
+            applied = run_migrations(connection)
+            print(f"Schema na versão {MIGRATIONS[-1][0]} ({len(applied)} migrações aplicadas)")
+        finally:
+            connection.close()
+    elif command == "worker":
+        # Só os workers da fila, sem servidor HTTP (suba a API com JOB_WORKERS=0 nesse caso)
+        if not init_database():
+            sys.exit(1)
+        print(f"Processando jobs com {JOB_WORKERS} workers (Ctrl+C para sair)")
+        start_job_workers(max(1, JOB_WORKERS))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            stop_job_workers()
+    elif command == "backfill-rollups":
+        # Reconstrói os rollups de vendas a partir dos pedidos: python main.py backfill-rollups [inicio] [fim]
+        start, end = [date.fromisoformat(arg) if arg else None for arg in (sys.argv[2:4] + [None, None])[:2]]
+        connection = get_db_connection()
+        if not connection:
+            sys.exit(1)
+        try:
+            days = backfill_rollups(connection, start, end)
+            print(f"Rollups reconstruídos: {days} dias com vendas")
+        finally:
+            connection.close()
+    elif command == "hot-product":
+        # Divide o estoque de um produto em slots: python main.py hot-product <id> [slots] (0 desfaz)
+        product_id = int(sys.argv[2])
+        slots = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+        connection = get_db_connection()
+        if not connection:
+            sys.exit(1)
+        try:
+            total = set_hot_product(connection, product_id, slots)
+        finally:
+            connection.close()
+        if total is None:
+            print(f"Produto {product_id} não encontrado")
+            sys.exit(1)
+        print(f"Produto {product_id}: estoque {total} em {slots or 'nenhum'} slot(s)")
+    elif command == "check-indexes":
+        # Falha se alguma consulta quente fizer varredura completa; rode com o banco populado,
+        # pois em tabelas quase vazias o otimizador pode preferir ler a tabela inteira
+        connection = get_db_connection()
+        if not connection:
+            sys.exit(1)
+        try:
+            results = explain_hot_queries(connection)
+        finally:
+            connection.close()
+        for result in results:
+            keys = ", ".join(f"{row['table']}:{row['type']}/{row['key']}" for row in result['plan'])
+            print(f"{'OK ' if result['uses_index'] else 'SCAN'} {result['query']}: {keys}")
+        sys.exit(0 if all(result['uses_index'] for result in results) else 1)
+    else:
+        import uvicorn
+        print("🚀 Iniciando servidor E-Commerce API...")
+        print("📖 Documentação disponível em: http://localhost:8000/docs")
+        print("🔍 Health check em: http://localhost:8000/health")
+        # Com mais de um processo o uvicorn precisa importar o app em cada worker: ao contrário do
+        # gunicorn --preload, cada processo importa tudo de novo (ver "Vários processos" no README)
+        uvicorn.run("main:app" if API_WORKERS > 1 else app, host="0.0.0.0", port=8000, workers=API_WORKERS)
@@ -1,5 +1,5 @@
 import React, { createContext, useContext, useState, useEffect, ReactNode } from 'react';
-import { CartItem, CartContextType } from '../types';
+import { CartItem, CartItemSet, CartContextType } from '../types';
 import { cartAPI } from '../services/api';
 import { useAuth } from './AuthContext';
 import toast from 'react-hot-toast';
@@ -87,6 +87,19 @@ export const CartProvider: React.FC<CartProviderProps> = ({ children }) => {
     }
   };
 
+  // Sincroniza várias quantidades de uma vez (uma requisição, uma transação)
+  const updateQuantities = async (changes: CartItemSet[]) => {
+    if (changes.length === 0) return;
+    try {
+      setIsLoading(true);
+      setItems(await cartAPI.setItems(changes));
+    } catch (error: any) {
+      toast.error(error.response?.data?.detail || 'Erro ao atualizar o carrinho');
+    } finally {
+      setIsLoading(false);
+    }
+  };
+
   const getCartTotal = () => {
     return items.reduce((total, item) => total + item.total_price, 0);
   };
@@ -103,6 +116,7 @@ export const CartProvider: React.FC<CartProviderProps> = ({ children }) => {
     items,
     addToCart,
     removeFromCart,
+    updateQuantities,
     getCartTotal,
     getCartItemsCount,
     clearCart,
@@ -4,17 +4,16 @@ import { ShoppingCart, Trash2, Plus, Minus, ArrowRight } from lucide-react;
 import { useCart } from ../contexts/CartContext;
 
 const Cart: React.FC = () => {
-  const { items, removeFromCart, getCartTotal, getCartItemsCount, isLoading } = useCart();
+  const { items, removeFromCart, updateQuantities, getCartTotal, getCartItemsCount, isLoading } = useCart();
 
   const handleQuantityChange = async (itemId: number, newQuantity: number) => {
     if (newQuantity <= 0) {
       await removeFromCart(itemId);
-    } else {
-      // Aqui você implementaria a atualização da quantidade
-      // Por simplicidade, vamos apenas remover se for 0
-      if (newQuantity === 0) {
-        await removeFromCart(itemId);
-      }
+      return;
+    }
+    const item = items.find(cartItem => cartItem.id === itemId);
+    if (item) {
+      await updateQuantities([{ product_id: item.product_id, quantity: newQuantity }]);
     }
   };
 
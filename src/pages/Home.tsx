@@ -18,8 +18,8 @@ const Home: React.FC = () => {
 
   const loadFeaturedProducts = async () => {
     try {
-      const products = await productsAPI.getAll();
-      setFeaturedProducts(products.slice(0, 6)); // Mostrar apenas 6 produtos
+      const page = await productsAPI.list({ limit: 6 }); // Mostrar apenas 6 produtos
+      setFeaturedProducts(page.items);
     } catch (error) {
       console.error('Erro ao carregar produtos:', error);
     } finally {
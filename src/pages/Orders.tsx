@@ -5,7 +5,9 @@ import { ordersAPI } from '../services/api';
 
 const Orders: React.FC = () => {
   const [orders, setOrders] = useState<Order[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(true);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
 
   useEffect(() => {
     loadOrders();
@@ -13,8 +15,9 @@ const Orders: React.FC = () => {
 
   const loadOrders = async () => {
     try {
-      const ordersData = await ordersAPI.getAll();
-      setOrders(ordersData);
+      const page = await ordersAPI.list();
+      setOrders(page.items);
+      setNextCursor(page.nextCursor);
     } catch (error) {
       console.error('Erro ao carregar pedidos:', error);
     } finally {
@@ -22,6 +25,20 @@ const Orders: React.FC = () => {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      setIsLoadingMore(true);
+      const page = await ordersAPI.list(nextCursor);
+      setOrders([...orders, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Erro ao carregar mais pedidos:', error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const getStatusColor = (status: string) => {
     switch (status.toLowerCase()) {
       case 'pending':
@@ -208,6 +225,19 @@ const Orders: React.FC = () => {
           </div>
         ))}
       </div>
+
+      {/* Load More */}
+      {nextCursor && (
+        <div className="text-center">
+          <button
+            onClick={loadMore}
+            className="btn-secondary"
+            disabled={isLoadingMore}
+          >
+            {isLoadingMore ? 'Carregando...' : 'Carregar mais'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -12,28 +12,47 @@ const Products: React.FC = () => {
   const [filteredProducts, setFilteredProducts] = useState<Product[]>([]);
   const [selectedCategory, setSelectedCategory] = useState<number | null>(null);
   const [searchTerm, setSearchTerm] = useState('');
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(true);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   
   const { addToCart } = useCart();
   const { user } = useAuth();
 
   useEffect(() => {
-    loadData();
+    loadCategories();
   }, []);
 
+  // A categoria é filtrada no servidor; trocar de categoria recomeça a paginação
   useEffect(() => {
-    filterProducts();
-  }, [products, selectedCategory, searchTerm]);
+    loadProducts();
+  }, [selectedCategory]);
 
-  const loadData = async () => {
+  // A busca é feita no servidor, com um pequeno atraso enquanto o usuário digita
+  useEffect(() => {
+    if (!searchTerm.trim()) {
+      setFilteredProducts(products);
+      return;
+    }
+    const timer = setTimeout(() => searchProducts(searchTerm), 250);
+    return () => clearTimeout(timer);
+  }, [products, searchTerm]);
+
+  const loadCategories = async () => {
     try {
-      const [productsData, categoriesData] = await Promise.all([
-        productsAPI.getAll(),
-        categoriesAPI.getAll()
-      ]);
-      
-      setProducts(productsData);
-      setCategories(categoriesData);
+      setCategories(await categoriesAPI.getAll());
+    } catch (error) {
+      console.error('Erro ao carregar categorias:', error);
+    }
+  };
+
+  const loadProducts = async () => {
+    try {
+      const page = await productsAPI.list(
+        selectedCategory ? { category_id: selectedCategory } : {}
+      );
+      setProducts(page.items);
+      setNextCursor(page.nextCursor);
     } catch (error) {
       console.error('Erro ao carregar dados:', error);
     } finally {
@@ -41,23 +60,30 @@ const Products: React.FC = () => {
     }
   };
 
-  const filterProducts = () => {
-    let filtered = products;
-
-    // Filtrar por categoria
-    if (selectedCategory) {
-      filtered = filtered.filter(product => product.category_id === selectedCategory);
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      setIsLoadingMore(true);
+      const page = await productsAPI.list({
+        ...(selectedCategory ? { category_id: selectedCategory } : {}),
+        after: nextCursor,
+      });
+      setProducts([...products, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Erro ao carregar mais produtos:', error);
+    } finally {
+      setIsLoadingMore(false);
     }
+  };
 
-    // Filtrar por termo de busca
-    if (searchTerm) {
-      filtered = filtered.filter(product =>
-        product.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        product.description.toLowerCase().includes(searchTerm.toLowerCase())
-      );
+  const searchProducts = async (term: string) => {
+    try {
+      const results = await productsAPI.search(term, selectedCategory ?? undefined);
+      setFilteredProducts(results);
+    } catch (error) {
+      console.error('Erro ao buscar produtos:', error);
     }
-
-    setFilteredProducts(filtered);
   };
 
   const handleAddToCart = async (productId: number) => {
@@ -191,6 +217,19 @@ const Products: React.FC = () => {
         ))}
       </div>
 
+      {/* Load More */}
+      {nextCursor && !searchTerm.trim() && (
+        <div className="text-center">
+          <button
+            onClick={loadMore}
+            className="btn-secondary"
+            disabled={isLoadingMore}
+          >
+            {isLoadingMore ? 'Carregando...' : 'Carregar mais'}
+          </button>
+        </div>
+      )}
+
       {/* No Results */}
       {filteredProducts.length === 0 && (
         <div className="text-center py-12">
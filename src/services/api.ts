@@ -8,10 +8,15 @@ import {
   CategoryCreate, 
   Product, 
   ProductCreate, 
+  ProductPage, 
+  ProductQuery, 
   CartItem, 
   CartItemCreate, 
+  CartItemSet, 
   Order, 
-  OrderCreate 
+  OrderCreate, 
+  OrderPage, 
+  OrderStatus 
 } from '../types';
 
 const API_BASE_URL = 'http://localhost:8000';
@@ -74,9 +79,17 @@ export const categoriesAPI = {
 
 // Products API
 export const productsAPI = {
-  getAll: async (categoryId?: number): Promise<Product[]> => {
-    const params = categoryId ? { category_id: categoryId } : {};
-    const response = await api.get('/products', { params });
+  list: async (query: ProductQuery = {}): Promise<ProductPage> => {
+    const response = await api.get('/products', { params: query });
+    return {
+      items: response.data,
+      nextCursor: response.headers['x-next-cursor'] ?? null,
+    };
+  },
+
+  search: async (q: string, categoryId?: number): Promise<Product[]> => {
+    const params = categoryId ? { q, category_id: categoryId } : { q };
+    const response = await api.get('/products/search', { params });
     return response.data;
   },
 
@@ -103,6 +116,11 @@ export const cartAPI = {
     return response.data;
   },
 
+  setItems: async (items: CartItemSet[]): Promise<CartItem[]> => {
+    const response = await api.post('/cart/batch', { items });
+    return response.data;
+  },
+
   removeItem: async (itemId: number): Promise<void> => {
     await api.delete(`/cart/${itemId}`);
   },
@@ -110,15 +128,23 @@ export const cartAPI = {
 
 // Orders API
 export const ordersAPI = {
-  getAll: async (): Promise<Order[]> => {
-    const response = await api.get('/orders');
-    return response.data;
+  list: async (after?: string): Promise<OrderPage> => {
+    const response = await api.get('/orders', { params: after ? { after } : {} });
+    return {
+      items: response.data,
+      nextCursor: response.headers['x-next-cursor'] ?? null,
+    };
   },
 
   create: async (order: OrderCreate): Promise<Order> => {
     const response = await api.post('/orders/checkout', order);
     return response.data;
   },
+
+  status: async (id: number): Promise<OrderStatus> => {
+    const response = await api.get(`/orders/${id}/status`);
+    return response.data;
+  },
 };
 
 export default api;
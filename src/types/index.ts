@@ -47,6 +47,23 @@ export interface Product {
   created_at: string;
 }
 
+export type ProductSort = 'name' | '-name' | 'price' | '-price' | 'created_at' | '-created_at';
+
+export interface ProductQuery {
+  category_id?: number;
+  min_price?: number;
+  max_price?: number;
+  in_stock?: boolean;
+  sort?: ProductSort;
+  limit?: number;
+  after?: string;
+}
+
+export interface ProductPage {
+  items: Product[];
+  nextCursor: string | null;
+}
+
 export interface ProductCreate {
   name: string;
   description: string;
@@ -71,6 +88,12 @@ export interface CartItemCreate {
   quantity: number;
 }
 
+// Quantidade final de um produto no carrinho (0 remove)
+export interface CartItemSet {
+  product_id: number;
+  quantity: number;
+}
+
 export interface OrderItem {
   product_id: number;
   quantity: number;
@@ -88,6 +111,16 @@ export interface Order {
   items: OrderItem[];
 }
 
+export interface OrderPage {
+  items: Order[];
+  nextCursor: string | null;
+}
+
+export interface OrderStatus {
+  id: number;
+  status: string;
+}
+
 export interface OrderCreate {
   shipping_address: string;
   payment_method: string;
@@ -107,6 +140,7 @@ export interface CartContextType {
   items: CartItem[];
   addToCart: (productId: number, quantity: number) => Promise<void>;
   removeFromCart: (itemId: number) => Promise<void>;
+  updateQuantities: (changes: CartItemSet[]) => Promise<void>;
   getCartTotal: () => number;
   getCartItemsCount: () => number;
   clearCart: () => void;
@@ -0,0 +1,119 @@
+"""Fixtures dos testes: um driver MySQL falso no lugar do mysql.connector.
+
+Os testes não precisam de um MySQL de verdade. Cada teste instala um `handler(sql, params)`
+que decide o que a query devolve (lista de linhas, ou tupla (linhas, rowcount)), e pode
+inspecionar as queries executadas em `fake_db.log`.
+"""
+import os
+import sys
+
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("JOB_WORKERS", "0")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import main
+
+
+class FakeCursor:
+    def __init__(self, db, dictionary=False, **kwargs):
+        self.db = db
+        self.dictionary = dictionary
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = 1
+        self.description = None
+
+    def execute(self, sql, params=None, **kwargs):
+        self.db.log.append((" ".join(sql.split()), params))
+        result = self.db.handler(" ".join(sql.split()), params)
+        self.rowcount = 0
+        if isinstance(result, tuple):
+            result, self.rowcount = result
+        self.rows = list(result or [])
+        self.rowcount = self.rowcount or len(self.rows)
+        if self.rows and isinstance(self.rows[0], dict):
+            self.description = [(key,) for key in self.rows[0]]
+            if not self.dictionary:
+                self.rows = [tuple(row.values()) for row in self.rows]
+
+    def executemany(self, sql, seq):
+        seq = list(seq)
+        self.db.log.append((" ".join(sql.split()), seq))
+        for params in seq:
+            self.db.handler(" ".join(sql.split()), params)
+        self.rowcount = len(seq)
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self.description or ())
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    in_transaction = False
+    unread_result = False
+
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.db, **kwargs)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def commit(self):
+        self.db.log.append(("COMMIT", None))
+
+    def rollback(self):
+        self.db.log.append(("ROLLBACK", None))
+
+    def start_transaction(self, **kwargs):
+        self.db.log.append(("BEGIN", None))
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.log = []
+        self.handler = lambda sql, params: []
+
+    def queries(self, prefix=""):
+        """SQL executado (sem COMMIT/ROLLBACK), opcionalmente filtrado pelo início"""
+        return [sql for sql, _ in self.log if sql not in ("COMMIT", "ROLLBACK", "BEGIN")
+                and sql.startswith(prefix)]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Troca o driver por um falso, com pools e caches novos para cada teste"""
+    db = FakeDatabase()
+    monkeypatch.setattr(main.mysql.connector, "connect", lambda **kwargs: FakeConnection(db))
+    monkeypatch.setattr(main, "db_pool", main.ConnectionPool(main.DB_CONFIG))
+    monkeypatch.setattr(main, "replica_pool", None)
+    monkeypatch.setattr(main, "catalog_cache", main.TTLCache(main.CATALOG_CACHE_SIZE, main.CATALOG_CACHE_TTL))
+    return db
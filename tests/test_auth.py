@@ -0,0 +1,52 @@
+"""Login e cadastro não seguram conexão do pool durante o bcrypt; usuário em cache não pega conexão."""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_login_releases_connection_before_bcrypt(fake_db, monkeypatch):
+    fake_db.handler = lambda sql, params: (
+        [{"username": "ana", "password_hash": "hash"}] if "FROM users" in sql else [])
+    in_use = []
+
+    def verify(plain, hashed):
+        in_use.append(main.db_pool.stats()["in_use"])
+        return True
+    monkeypatch.setattr(main, "verify_password", verify)
+
+    response = TestClient(main.app).post("/auth/login", json={"username": "ana", "password": "secret"})
+    assert response.status_code == 200
+    assert in_use == [0]
+
+
+def test_register_hashes_before_borrowing_connection(fake_db, monkeypatch):
+    user = {"id": 1, "username": "ana", "email": "ana@example.com", "full_name": "Ana", "is_active": True}
+    fake_db.handler = lambda sql, params: [user] if sql.startswith("SELECT id, username") else []
+    in_use = []
+
+    def get_hash(password):
+        in_use.append(main.db_pool.stats()["in_use"])
+        return "hash"
+    monkeypatch.setattr(main, "get_password_hash", get_hash)
+
+    response = TestClient(main.app).post("/auth/register", json={
+        "username": "ana", "email": "ana@example.com", "password": "secret", "full_name": "Ana"})
+    assert response.status_code == 200
+    assert in_use == [0]
+
+
+def test_cached_user_does_not_borrow_connection(fake_db, monkeypatch):
+    monkeypatch.setattr(main, "user_cache", main.TTLCache(10, 60))
+    user = {"id": 1, "username": "ana", "email": "ana@example.com", "full_name": "Ana", "is_active": True}
+    fake_db.handler = lambda sql, params: [user] if "FROM users" in sql else []
+    token = main.create_access_token({"sub": "ana"})
+    credentials = main.HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    assert main.get_current_user(credentials).id == 1
+    assert main.db_pool.stats()["in_use"] == 0
+
+    # Acerto no cache: nenhuma conexão emprestada, nenhuma query
+    monkeypatch.setattr(main, "acquire_from", lambda pool: pytest.fail("borrowed a connection"))
+    assert main.get_current_user(credentials).id == 1
+    assert len(fake_db.queries("SELECT")) == 1
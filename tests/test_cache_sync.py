@@ -0,0 +1,112 @@
+"""Invalidações gravadas por um processo chegam aos outros em tempo limitado."""
+import time
+
+import pytest
+
+import main
+
+
+class InvalidationTable:
+    """cache_invalidations em memória, compartilhada pelas instâncias de CacheSync do teste"""
+
+    def __init__(self):
+        self.rows = []
+
+    def insert(self, row_id, origin, scope, key):
+        self.rows.append((row_id, origin, scope, key))
+
+    def handler(self, sql, params):
+        if sql.startswith("INSERT INTO cache_invalidations"):
+            self.insert(len(self.rows) + 1, *params)
+        elif sql.startswith("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations"):
+            return [(max((row[0] for row in self.rows), default=0),)]
+        elif sql.startswith("SELECT id, origin, scope, cache_key FROM cache_invalidations"):
+            last_id, batch = params
+            return sorted(row for row in self.rows if row[0] > last_id)[:batch]
+        return []
+
+
+@pytest.fixture
+def table(fake_db, monkeypatch):
+    monkeypatch.setattr(main, "CACHE_SYNC", True)
+    table = InvalidationTable()
+    fake_db.handler = table.handler
+    return table
+
+
+def publish(sync, scope, keys):
+    connection = main.db_pool.acquire()
+    try:
+        sync.publish(connection.cursor(), scope, keys)
+    finally:
+        connection.close()
+
+
+def wait_until(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return condition()
+
+
+def test_write_in_one_worker_reaches_the_other(table):
+    writer, reader = main.CacheSync(interval=0.05), main.CacheSync(interval=0.05)
+    writer.start()
+    reader.start()
+    try:
+        main.catalog_cache.set(("product", 7), (b"{}", "etag"))
+        started = time.monotonic()
+        publish(writer, "product", [7])
+        assert wait_until(lambda: main.catalog_cache.get(("product", 7)) is None, timeout=1)
+        assert time.monotonic() - started < 1
+        assert reader.stats()["applied"] == 1
+    finally:
+        writer.stop()
+        reader.stop()
+
+
+def test_own_invalidations_are_skipped(table):
+    sync = main.CacheSync()
+    sync.start()
+    sync.stop()
+    main.catalog_cache.set(("product", 7), (b"{}", "etag"))
+    publish(sync, "product", [7])
+    sync.poll()
+    assert main.catalog_cache.get(("product", 7)) is not None
+    assert sync.stats()["last_id"] == 1
+
+
+def test_out_of_order_commit_is_not_skipped(table):
+    sync = main.CacheSync()
+    sync.start()
+    sync.stop()
+    main.catalog_cache.set(("product", 9), (b"{}", "etag"))
+    # O id 2 confirma antes do id 1: o id 1 continua sendo procurado nas próximas consultas
+    table.insert(2, "other", "categories", None)
+    sync.poll()
+    assert sync.stats()["pending_gaps"] == 1
+    table.insert(1, "other", "product", "9")
+    sync.poll()
+    assert main.catalog_cache.get(("product", 9)) is None
+    assert sync.stats()["last_id"] == 2
+    assert sync.stats()["pending_gaps"] == 0
+
+
+def test_read_your_writes_marker_reaches_other_workers(table, monkeypatch):
+    monkeypatch.setattr(main, "replica_pool", main.ConnectionPool(main.DB_CONFIG))
+    monkeypatch.setattr(main, "recent_writers", main.TTLCache(100, 5))
+    writer, reader = main.CacheSync(), main.CacheSync()
+    writer.start()
+    reader.start()
+    writer.stop()
+    reader.stop()
+    monkeypatch.setattr(main, "cache_sync", writer)
+    connection = main.db_pool.acquire()
+    main.mark_user_write("ana", connection)
+    connection.close()
+    main.recent_writers.pop("ana")  # o processo que leu não é o que gravou
+
+    reader.poll()
+    assert main.recent_writers.get("ana")
@@ -0,0 +1,40 @@
+"""Cache do catálogo: um load que corre com uma invalidação não guarda o valor antigo."""
+from datetime import datetime
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+
+import main
+
+PRODUCT = {"id": 7, "name": "Caneca", "description": None, "price": Decimal("19.90"), "stock": 3,
+           "category_id": 1, "image_url": None, "created_at": datetime(2024, 1, 1)}
+
+
+def test_invalidation_during_load_is_not_overwritten(fake_db):
+    def handler(sql, params):
+        if sql.startswith("SELECT * FROM products WHERE id"):
+            # Uma escrita concorrente invalida o produto enquanto a leitura está em andamento
+            main.invalidate_catalog_cache([7])
+            return [dict(PRODUCT)]
+        return []
+    fake_db.handler = handler
+
+    response = TestClient(main.app).get("/products/7")
+    assert response.status_code == 200
+    assert main.catalog_cache.get(("product", 7)) is None
+
+    fake_db.handler = lambda sql, params: [dict(PRODUCT)] if "FROM products" in sql else []
+    TestClient(main.app).get("/products/7")
+    assert main.catalog_cache.get(("product", 7)) is not None
+
+
+def test_forgotten_invalidations_reject_older_loads():
+    cache = main.TTLCache(2, 60)
+    since = cache.version()
+    for key in ("a", "b", "c"):
+        cache.pop(key)
+    # O registro de "a" saiu do limite: na dúvida, o valor carregado antes não entra
+    cache.set("a", 1, since=since)
+    assert cache.get("a") is None
+    cache.set("a", 1, since=cache.version())
+    assert cache.get("a") == 1
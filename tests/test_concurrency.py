@@ -0,0 +1,48 @@
+"""Uma query lenta não pode serializar requisições que não dependem dela; admissão pelo uso do pool."""
+import asyncio
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_slow_query_does_not_block_other_requests(fake_db):
+    def handler(sql, params):
+        if "category_id = %s" in sql:
+            time.sleep(1)
+        return []
+    fake_db.handler = handler
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            slow = asyncio.create_task(client.get("/products", params={"category_id": 1}))
+            await asyncio.sleep(0.05)
+            started = time.monotonic()
+            fast = await client.get("/categories")
+            fast_elapsed = time.monotonic() - started
+            assert not slow.done()
+            return fast, fast_elapsed, await slow
+
+    fast, fast_elapsed, slow = asyncio.run(scenario())
+    assert fast.status_code == 200
+    assert slow.status_code == 200
+    assert fast_elapsed < 0.5
+
+
+def test_admission_follows_pool_usage(fake_db):
+    client = TestClient(main.app)
+    # Conexões presas por outro trabalho (ex.: workers de jobs), sem requisição em andamento
+    held = [main.db_pool.acquire() for _ in range(main.ADMISSION_MAX_IN_USE)]
+    try:
+        rejected = client.post("/orders/checkout", json={})
+        assert rejected.status_code == 503
+        assert rejected.headers["Retry-After"]
+        # Leituras do catálogo são isentas e usam a folga do pool
+        assert client.get("/categories").status_code == 200
+    finally:
+        for connection in held:
+            connection.close()
+    assert client.post("/orders/checkout", json={}).status_code != 503
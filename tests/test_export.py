@@ -0,0 +1,42 @@
+"""Export em streaming: a conexão sempre volta ao pool, e sem o net_write_timeout longo."""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+ROWS = [{"id": i, "name": f"Produto {i}"} for i in range(1, 6)]
+
+
+@pytest.fixture
+def export_db(fake_db, monkeypatch):
+    monkeypatch.setattr(main, "EXPORT_API_KEY", "secret")
+    monkeypatch.setattr(main, "EXPORT_CHUNK_SIZE", 2)
+    fake_db.handler = lambda sql, params: [dict(row) for row in ROWS] if sql.startswith("SELECT") else []
+    return fake_db
+
+
+def test_finished_export_resets_session(export_db):
+    response = TestClient(main.app).get("/export/products", headers={"x-api-key": "secret"})
+    assert response.status_code == 200
+    assert len(response.content.splitlines()) == len(ROWS)
+    assert export_db.queries("SET SESSION net_write_timeout") == [
+        "SET SESSION net_write_timeout = 600", "SET SESSION net_write_timeout = DEFAULT"]
+    stats = main.db_pool.stats()
+    assert stats["in_use"] == 0 and stats["invalidated"] == 0
+
+
+def test_disconnect_before_first_chunk_releases_connection(export_db):
+    connection = main.db_pool.acquire()
+    rows = main.stream_export(connection, main.EXPORTS["products"], "ndjson")
+    main.close_export(rows, connection)
+    assert main.db_pool.stats()["in_use"] == 0
+
+
+def test_disconnect_mid_stream_discards_connection(export_db):
+    connection = main.db_pool.acquire()
+    rows = main.stream_export(connection, main.EXPORTS["products"], "ndjson")
+    next(rows)
+    main.close_export(rows, connection)
+    stats = main.db_pool.stats()
+    # A sessão ficou com o timeout longo e resultado pendente: a conexão não volta para o pool
+    assert stats["in_use"] == 0 and stats["invalidated"] == 1
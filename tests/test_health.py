@@ -0,0 +1,74 @@
+"""Readiness: a inicialização se recupera de um banco fora do ar e o probe não depende do pool
+nem do threadpool das requisições."""
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def ready(monkeypatch):
+    monkeypatch.setattr(main, "primary_probe", main.DatabaseProbe(main.DB_CONFIG))
+    main.app_ready.set()
+    yield
+    main.app_ready.clear()
+
+
+def test_startup_retries_until_database_is_up(monkeypatch):
+    attempts = iter([False, False, True])
+    started = []
+    monkeypatch.setattr(main, "STARTUP_RETRY_INTERVAL", 0)
+    monkeypatch.setitem(main.warmup_state, "init_attempts", 0)
+    monkeypatch.setattr(main, "init_database", lambda: next(attempts))
+    monkeypatch.setattr(main, "build_search_index", lambda: False)
+    monkeypatch.setattr(main, "start_job_workers", lambda: started.append("jobs"))
+    monkeypatch.setattr(main.cart_store, "start", lambda: started.append("cart"))
+    monkeypatch.setattr(main.cache_sync, "start", lambda: started.append("cache_sync"))
+    monkeypatch.setattr(main, "warm_up", lambda: started.append("warm_up"))
+
+    main.start_app()
+    assert main.warmup_state["init_attempts"] == 3
+    assert started == ["jobs", "cart", "cache_sync", "warm_up"]
+
+
+def test_startup_retries_stop_on_shutdown(monkeypatch):
+    monkeypatch.setattr(main, "init_database", lambda: False)
+    monkeypatch.setattr(main, "warm_up", lambda: pytest.fail("aquecimento sem banco"))
+    main.startup_stop.set()
+    try:
+        main.start_app()
+    finally:
+        main.startup_stop.clear()
+
+
+def test_readiness_does_not_wait_for_pool(fake_db, monkeypatch, ready):
+    # Pool saturado: emprestar uma conexão esperaria DB_POOL_TIMEOUT
+    monkeypatch.setattr(main.db_pool, "acquire", lambda: pytest.fail("readiness usou o pool"))
+    response = TestClient(main.app).get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["database"]["status"] == "up"
+    assert fake_db.queries() == ["SELECT 1"]
+
+
+def test_readiness_reports_database_down(fake_db, monkeypatch, ready):
+    def handler(sql, params):
+        raise main.Error("Lost connection to MySQL server")
+    fake_db.handler = handler
+    response = TestClient(main.app).get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "unavailable"
+
+
+def test_readiness_pings_outside_request_threadpool(fake_db, ready):
+    threads = []
+
+    def handler(sql, params):
+        threads.append(threading.current_thread().name)
+        return [(1,)]
+    fake_db.handler = handler
+    # Endpoint async: com o threadpool esgotado por requisições lentas, o probe não entra na fila
+    assert main.asyncio.iscoroutinefunction(main.readiness)
+    assert TestClient(main.app).get("/health/ready").status_code == 200
+    assert len(threads) == 1 and threads[0].startswith("health-probe")
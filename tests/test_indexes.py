@@ -0,0 +1,140 @@
+"""Consultas quentes: as de HOT_QUERIES são as que os endpoints executam, e todas usam índice.
+
+O teste de EXPLAIN precisa de um MySQL de verdade: ele usa o banco `TEST_DB_NAME` (padrão
+`ecommerce_test`, cujos dados são APAGADOS) com as credenciais de DB_HOST/DB_USER/... e é
+pulado se o servidor não estiver acessível.
+"""
+import os
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+TEST_DB_NAME = os.getenv("TEST_DB_NAME", "ecommerce_test")
+USER = main.User(id=1, username="admin", email="admin@example.com", full_name="Admin", is_active=True)
+
+
+def normalize(sql):
+    return " ".join(sql.split())
+
+
+def hot_query(name):
+    return normalize(next(query for label, query, _ in main.HOT_QUERIES if label == name))
+
+
+@pytest.mark.parametrize("path, name", [
+    ("/products", "GET /products"),
+    ("/products?category_id=1", "GET /products?category_id"),
+    ("/products?category_id=1&sort=price", "GET /products?category_id&sort=price"),
+    ("/products?after=" + main.encode_cursor("m", 1), "GET /products?after"),
+    ("/products?category_id=1&sort=price&after=" + main.encode_cursor("10.00", 1),
+     "GET /products?category_id&sort=price&after"),
+    ("/products?min_price=10&max_price=100&sort=price", "GET /products?min_price&max_price&sort=price"),
+    ("/products/1", "GET /products/{id}"),
+    ("/cart", "GET /cart"),
+    ("/orders", "GET /orders"),
+    ("/orders?after=" + main.encode_cursor("2024-01-01T00:00:00", 1), "GET /orders?after"),
+])
+def test_hot_queries_match_handlers(fake_db, monkeypatch, path, name):
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_current_user, lambda: USER)
+    TestClient(main.app).get(path)
+    assert hot_query(name) in fake_db.queries()
+
+
+def test_create_index_skips_columns_already_indexed(fake_db):
+    # O InnoDB cria o índice "order_id" para a FOREIGN KEY; outro índice com a mesma coluna sobraria
+    fake_db.handler = lambda sql, params: [("PRIMARY", "id"), ("order_id", "order_id"),
+                                           ("product_id", "product_id")]
+    cursor = main.db_pool.acquire().cursor()
+    main.create_index("order_items", "idx_order_items_order", "order_id")(cursor)
+    main.create_index("order_items", "idx_order_items_order_product", "order_id, product_id")(cursor)
+    assert fake_db.queries("CREATE INDEX") == [
+        "CREATE INDEX idx_order_items_order_product ON order_items (order_id, product_id)"]
+
+
+@pytest.mark.parametrize("plan, uses_index", [
+    ([{"type": "ref", "key": "idx_orders_user_created", "rows": 40}], True),
+    ([{"type": "range", "key": "idx_products_category_price", "rows": 900}], True),
+    # Varredura do índice parada pelo LIMIT (ORDER BY name sem filtro)
+    ([{"type": "index", "key": "idx_products_name", "rows": 51}], True),
+    # Varredura do índice inteiro: tem "key", mas lê a tabela toda
+    ([{"type": "index", "key": "idx_products_name", "rows": 2000}], False),
+    ([{"type": "ALL", "key": None, "rows": 2000}], False),
+    ([{"type": "ref", "key": "PRIMARY", "rows": 1}, {"type": "ALL", "key": None, "rows": 2000}], False),
+])
+def test_explain_hot_queries_rejects_scans(fake_db, plan, uses_index):
+    fake_db.handler = lambda sql, params: [dict(row) for row in plan] if sql.startswith("EXPLAIN") else []
+    results = main.explain_hot_queries(main.db_pool.acquire())
+    assert len(results) == len(main.HOT_QUERIES)
+    by_name = {result["query"]: result["uses_index"] for result in results}
+    # O LIMIT de GET /products é PRODUCT_PAGE_SIZE + 1; a consulta por id não tem LIMIT
+    assert by_name["GET /products"] == uses_index
+    assert by_name["GET /products/{id}"] == (uses_index and plan[0]["type"] != "index")
+
+
+@pytest.fixture(scope="module")
+def mysql_connection():
+    config = {**main.DB_CONFIG, "database": TEST_DB_NAME}
+    try:
+        server = main.mysql.connector.connect(**{k: v for k, v in config.items() if k != "database"})
+    except main.Error as e:
+        pytest.skip(f"MySQL indisponível: {e}")
+    cursor = server.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{TEST_DB_NAME}`")
+    cursor.close()
+    server.close()
+
+    connection = main.mysql.connector.connect(**config)
+    main.run_migrations(connection)
+    seed(connection)
+    yield connection
+    connection.close()
+
+
+def seed(connection):
+    """Dados suficientes para o otimizador preferir os índices a varrer as tabelas"""
+    cursor = connection.cursor()
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    tables = ("order_items", "orders", "cart_items", "products", "categories", "users",
+              "sales_daily", "sales_product_daily", "sales_category_daily")
+    for table in tables:
+        cursor.execute(f"TRUNCATE TABLE {table}")
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    cursor.executemany(
+        "INSERT INTO users (username, email, password_hash, full_name) VALUES (%s, %s, %s, %s)",
+        [("admin" if i == 0 else f"user{i}", f"user{i}@example.com", "x", f"User {i}") for i in range(50)])
+    cursor.executemany("INSERT INTO categories (name, description) VALUES (%s, %s)",
+                       [(f"Categoria {i}", None) for i in range(20)])
+    cursor.executemany(main.PRODUCT_INSERT,
+                       [(f"Produto {i}", None, Decimal(100 + i), 10, 1 + i % 20, None) for i in range(2000)])
+    cursor.executemany(
+        "INSERT INTO orders (user_id, total_amount, shipping_address, payment_method) VALUES (%s, %s, %s, %s)",
+        [(1 + i % 50, Decimal("10.00"), "Rua A, 1", "pix") for i in range(2000)])
+    cursor.executemany("INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (%s, %s, %s, %s)",
+                       [(1 + i // 2, 1 + i % 2000, 1, Decimal("5.00")) for i in range(4000)])
+    cursor.executemany("INSERT INTO cart_items (user_id, product_id, quantity) VALUES (%s, %s, %s)",
+                       [(1 + i % 50, 1 + i, 1) for i in range(1000)])
+    first = date(2024, 1, 1)
+    days = [first + timedelta(days=i) for i in range(365)]
+    cursor.executemany("INSERT INTO sales_daily (day, slot, orders, units, revenue) VALUES (%s, %s, 1, 1, 1)",
+                       [(day, slot) for day in days for slot in range(4)])
+    cursor.executemany(
+        "INSERT INTO sales_product_daily (day, product_id, slot, units, revenue) VALUES (%s, %s, 0, 1, 1)",
+        [(day, product_id) for day in days for product_id in range(1, 21)])
+    cursor.executemany(
+        "INSERT INTO sales_category_daily (day, category_id, slot, units, revenue) VALUES (%s, %s, 0, 1, 1)",
+        [(day, category_id) for day in days for category_id in range(1, 21)])
+    connection.commit()
+    for table in tables:
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    cursor.close()
+
+
+@pytest.mark.parametrize("name", [label for label, _, _ in main.HOT_QUERIES])
+def test_hot_query_uses_index(mysql_connection, name):
+    result = next(item for item in main.explain_hot_queries(mysql_connection) if item["query"] == name)
+    assert result["uses_index"], result["plan"]
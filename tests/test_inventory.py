@@ -0,0 +1,65 @@
+"""Reservas de estoque: sem gap lock entre usuários, cache coerente e limpeza independente da fila."""
+import threading
+
+import pytest
+
+import main
+
+PRODUCT = ("product", 7)
+
+
+@pytest.fixture
+def stock_db(fake_db, monkeypatch):
+    monkeypatch.setattr(main, "CACHE_SYNC", True)
+
+    def handler(sql, params):
+        if sql.startswith("SELECT id, stock_slots FROM products"):
+            return [(7, 0)]
+        if sql.startswith("UPDATE products SET stock"):
+            return [], 1
+        if sql.startswith("SELECT user_id, product_id, quantity FROM stock_reservations"):
+            return [(1, 7, 3)]
+        return []
+    fake_db.handler = handler
+    main.catalog_cache.set(PRODUCT, {"id": 7})
+    return fake_db
+
+
+def published(db):
+    return [row[1:] for sql, rows in db.log if sql.startswith("INSERT INTO cache_invalidations") for row in rows]
+
+
+def test_reservation_row_is_created_before_lock(stock_db):
+    connection = main.db_pool.acquire()
+    main.MySQLCartStore().add(connection, 1, 7, 2)
+
+    queries = stock_db.queries()
+    placeholder = queries.index(next(sql for sql in queries if sql.startswith("INSERT INTO stock_reservations")))
+    lock = queries.index(next(sql for sql in queries
+                              if "FROM stock_reservations" in sql and sql.endswith("FOR UPDATE")))
+    # O FOR UPDATE só encontra linhas existentes: nada de gap lock disputado com outros usuários
+    assert placeholder < lock
+    assert stock_db.queries("UPDATE stock_reservations SET quantity")
+    assert main.catalog_cache.get(PRODUCT) is None
+    assert published(stock_db) == [("product", "7")]
+
+
+def test_expired_reservations_invalidate_catalog(stock_db):
+    connection = main.db_pool.acquire()
+    assert main.release_expired_reservations(connection) == 1
+
+    assert stock_db.queries("UPDATE products SET stock = stock + %s")
+    assert main.catalog_cache.get(PRODUCT) is None
+    assert published(stock_db) == [("product", "7")]
+
+
+def test_inventory_sweep_runs_with_busy_queue(monkeypatch, fake_db):
+    swept = threading.Event()
+    # Workers sempre ocupados: a fila nunca fica vazia
+    monkeypatch.setattr(main, "job_worker", lambda: main.job_stop.wait())
+    monkeypatch.setattr(main, "maintain_inventory", lambda connection: swept.set())
+    main.start_job_workers(1)
+    try:
+        assert swept.wait(2)
+    finally:
+        main.stop_job_workers()
@@ -0,0 +1,12 @@
+"""Fila de jobs: um job cujo worker morre em toda tentativa termina como failed."""
+import main
+
+
+def test_claim_respects_max_attempts(fake_db):
+    main.claim_jobs(main.db_pool.acquire(), 10)
+
+    expire, claim = fake_db.queries("UPDATE jobs")
+    # Primeiro os leases vencidos na última tentativa viram failed; depois a reserva, limitada às tentativas
+    assert expire.startswith("UPDATE jobs SET status = 'failed'")
+    assert "status = 'running' AND run_at <= NOW() AND attempts >= max_attempts" in expire
+    assert "AND attempts < max_attempts" in claim
@@ -0,0 +1,55 @@
+"""GET /orders: número constante de queries por página, independente do tamanho dela."""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+USER = main.User(id=1, username="ana", email="ana@example.com", full_name="Ana", is_active=True)
+ORDERS = [dict(id=i, user_id=1, total_amount=Decimal("5.00"), shipping_address="Rua A, 1",
+               payment_method="pix", status="pending", created_at=datetime(2024, 1, 1) - timedelta(days=i))
+          for i in range(1, 51)]
+
+
+@pytest.fixture
+def client(fake_db):
+    def handler(sql, params):
+        if "FROM orders" in sql:
+            return [dict(order) for order in ORDERS[:params[-1]]]
+        if "FROM order_items" in sql:
+            return [dict(order_id=order_id, product_id=1, quantity=2, price=Decimal("2.50"))
+                    for order_id in params]
+        return []
+    fake_db.handler = handler
+    main.app.dependency_overrides[main.get_current_user] = lambda: USER
+    yield TestClient(main.app)
+    main.app.dependency_overrides.pop(main.get_current_user, None)
+
+
+@pytest.mark.parametrize("limit", [1, 5, 20])
+def test_order_page_query_count_is_constant(client, fake_db, limit):
+    response = client.get("/orders", params={"limit": limit})
+    assert response.status_code == 200
+    orders = response.json()
+    assert len(orders) == limit
+    assert all(len(order["items"]) == 1 for order in orders)
+    # Uma query para a página de pedidos e uma para os itens de todos eles
+    assert len(fake_db.queries()) == 2
+    assert len(fake_db.queries("SELECT order_id, product_id, quantity, price FROM order_items")) == 1
+
+
+def test_next_page_uses_cursor(client, fake_db):
+    first = client.get("/orders", params={"limit": 5})
+    cursor = first.headers["X-Next-Cursor"]
+    del fake_db.log[:]
+
+    response = client.get("/orders", params={"limit": 5, "after": cursor})
+    assert response.status_code == 200
+    assert len(fake_db.queries()) == 2
+    sql, params = fake_db.log[0]
+    # Forma que o MySQL consegue ler como range de (user_id, created_at)
+    assert "(created_at < %s OR (created_at = %s AND id < %s))" in sql
+    assert params[1] == params[2] == ORDERS[4]["created_at"].isoformat()
+    assert params[3] == 5  # id do último pedido da primeira página
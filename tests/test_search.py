@@ -0,0 +1,66 @@
+"""Reconstrução do índice de busca sem bloquear as buscas; carga em lote sem prender conexão."""
+import threading
+
+from fastapi.testclient import TestClient
+
+import main
+
+USER = main.User(id=1, username="ana", email="ana@example.com", full_name="Ana", is_active=True)
+
+
+def test_build_does_not_block_searches():
+    index = main.ProductSearchIndex()
+    index.build([(1, "Câmera digital", "", None)])
+    halfway, resume = threading.Event(), threading.Event()
+
+    def rows():
+        yield (2, "Câmera compacta", "", None)
+        halfway.set()
+        resume.wait(5)
+        yield (3, "Livro", "", None)
+
+    builder = threading.Thread(target=index.build, args=(rows(),))
+    builder.start()
+    assert halfway.wait(5)
+    # Durante a reconstrução as buscas usam o índice antigo, e escritas não se perdem
+    assert index.search("camera") == [1]
+    index.add(4, "Câmera antiga", "", None)
+    resume.set()
+    builder.join(5)
+
+    assert sorted(index.search("camera")) == [2, 4]
+    assert index.search("livro") == [3]
+
+
+def test_bulk_import_reindexes_only_new_products(fake_db, monkeypatch):
+    monkeypatch.setattr(main, "search_index", main.ProductSearchIndex())
+    fake_db.handler = lambda sql, params: (
+        [(11, "Kit novo", "", None)] if sql.startswith("SELECT id, name, description, category_id FROM products WHERE id >")
+        else [])
+    connection = main.db_pool.acquire()
+    try:
+        main.reindex_products_since(connection, 10)
+    finally:
+        connection.close()
+    assert fake_db.log[0][1] == (10,)
+    assert main.search_index.search("kit") == [11]
+
+
+def test_bulk_import_holds_no_connection_between_batches(fake_db, monkeypatch):
+    monkeypatch.setattr(main, "search_index", main.ProductSearchIndex())
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_current_user, lambda: USER)
+    fake_db.handler = lambda sql, params: [(10,)] if sql.startswith("SELECT COALESCE(MAX(id), 0)") else []
+    in_use = []
+
+    async def records(request):
+        # Um upload lento: entre uma linha e outra, o pool não deve ter conexão emprestada
+        for line in range(1, 6):
+            in_use.append(main.db_pool.stats()["in_use"])
+            yield line, {"name": f"Produto {line}", "description": "Lote", "price": "1.00", "stock": 1,
+                         "category_id": 1}
+    monkeypatch.setattr(main, "iter_import_records", records)
+
+    response = TestClient(main.app).post("/products/bulk", params={"batch_size": 2})
+    assert response.json()["inserted"] == 5
+    assert in_use == [0] * 5
+    assert len(fake_db.queries("INSERT INTO products")) == 3